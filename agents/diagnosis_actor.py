@@ -1,12 +1,50 @@
+import asyncio
 import logging
 from langchain_core.messages import SystemMessage
 from state.diagnosis import DiagnosisState
-from model.orchestrator import orchestrator_model
+from state.pet_profile import ProfileView
+from model.cached import cached_orchestrator_model
 from state.diagnosis import DiagnosisActorOutput
 
 logger = logging.getLogger(__name__)
 
-def diagnosis_actor_node(state: DiagnosisState):
+# 结构化绑定在 import 时做一次：with_structured_output 每次都会重建
+# RunnableBinding + schema 转换，没必要每个请求付一遍
+_ACTOR_LLM = cached_orchestrator_model.with_structured_output(
+    DiagnosisActorOutput, method="function_calling"
+)
+
+# Prompt 模板常量：避免每次调用重新构造大段 f-string；
+# 固定前缀 (Role/Task/Constraints) 放在变量段之前，字节稳定才能吃到服务端 prompt 前缀缓存
+_ACTOR_PROMPT_TMPL = """
+    # Role
+    You are a Senior Veterinary Diagnostician. Your job is to identify the SINGLE most likely medical condition based strictly on the provided Evidence.
+
+    # Task
+    1. Analyze the patient's symptoms against the Evidence.
+    2. Identify the ONE condition that best matches the symptom pattern.
+    3. Even if multiple conditions are possible, pick the one with the strongest evidence overlap.
+    4. Formulate professional advice.
+
+    # Constraints
+    - IF the evidence contradicts the symptoms (e.g., evidence says "Cat" but patient is "Dog"), ignore that evidence.
+    - IF no sufficient evidence exists to make a match, admit it in the reasoning.
+
+    # Patient Profile
+    - Species: {species}
+    - Breed: {breed}
+    - Age: {age}
+    - Reported Symptoms: {symptoms}
+
+    # Evidence (Retrieved Medical Records)
+    {evidence}
+
+    # Output Requirements
+    - reasoning: You can write this in English or {user_lang}, whichever is more precise.
+    - advice_for_owner: **MUST BE WRITTEN IN {user_lang}.** (This is crucial for the user to understand).
+    """
+
+async def diagnosis_actor_node(state: DiagnosisState):
     """
     Actor Node: 根据 Profile 和 Retrieved Docs 生成初步诊断。
     """
@@ -14,7 +52,9 @@ def diagnosis_actor_node(state: DiagnosisState):
     
     # 1. 获取输入
     profile = state.get("pet_profile")
+    view = state.get("pet_profile_view") or ProfileView.from_profile(profile)
     retrieved_docs = state.get("retrieved_docs", [])
+    retrieved_docs_str = state.get("retrieved_docs_str", "")
     
     # 守卫逻辑：如果没有检索到文档，Actor 无法工作
     if not retrieved_docs:
@@ -23,53 +63,32 @@ def diagnosis_actor_node(state: DiagnosisState):
             "diagnosis_draft": None
         }
 
-    user_lang = profile.language if profile.language else "English"
+    user_lang = view.language
     
     # 2. 构造 Prompt
     # 注意：retrieved_docs 已经是格式化好的包含 Diagnosis 字段的字符串列表
-    actor_prompt = f"""
-    # Role
-    You are a Senior Veterinary Diagnostician. Your job is to identify the SINGLE most likely medical condition based strictly on the provided Evidence.
-
-    # Patient Profile
-    - Species: {getattr(profile.species, "value", str(profile.species))}
-    - Breed: {profile.breed}
-    - Age: {profile.age}
-    - Reported Symptoms: {profile.symptoms}
-
-    # Evidence (Retrieved Medical Records)
-    {chr(10).join(retrieved_docs)}  # chr(10) -> \n
-    
-    # Task
-    1. Analyze the patient's symptoms against the Evidence.
-    2. Identify the ONE condition that best matches the symptom pattern.
-    3. Even if multiple conditions are possible, pick the one with the strongest evidence overlap.
-    4. Formulate professional advice.
-
-    # Constraints
-    - IF the evidence contradicts the symptoms (e.g., evidence says "Cat" but patient is "Dog"), ignore that evidence.
-    - IF no sufficient evidence exists to make a match, admit it in the reasoning.
-    
-    # Output Requirements
-    - reasoning: You can write this in English or {user_lang}, whichever is more precise.
-    - advice_for_owner: **MUST BE WRITTEN IN {user_lang}.** (This is crucial for the user to understand).
-    """
+    actor_prompt = _ACTOR_PROMPT_TMPL.format_map({
+        "species": view.species,
+        "breed": view.breed,
+        "age": view.age,
+        "symptoms": view.symptoms_joined,
+        "evidence": retrieved_docs_str,
+        "user_lang": user_lang,
+    })
 
     # 3. 调用 LLM
     try:
-        # 绑定结构化输出
-        actor_model = orchestrator_model.with_structured_output(DiagnosisActorOutput)
-        
-        actor_response: DiagnosisActorOutput = actor_model.invoke([
-            SystemMessage(content=actor_prompt)
-        ])
+        actor_response: DiagnosisActorOutput = await asyncio.to_thread(
+            _ACTOR_LLM.invoke, [SystemMessage(content=actor_prompt)]
+        )
         
         logger.info(f"Actor Diagnosis: {actor_response.most_likely_condition}")
-        
+
         # 4. 更新 State
         # 将结果存入 'diagnosis_draft' 传给 Critic，暂时不更新 messages
+        # 直接传 Pydantic 对象，省掉 dump + Critic 侧重新校验
         return {
-            "diagnosis_draft": actor_response.model_dump()
+            "diagnosis_draft": actor_response
         }
 
     except Exception as e:
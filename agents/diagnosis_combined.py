@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from langchain_core.messages import SystemMessage, AIMessage
+from state.diagnosis import DiagnosisState
+from state.pet_profile import ProfileView
+from model.cached import cached_orchestrator_model
+from state.diagnosis import DiagnosisCombinedOutput
+from agents.diagnosis_retriever import schedule_speculative_prefetch
+
+logger = logging.getLogger(__name__)
+
+# 结构化绑定常量：import 时构建一次，节点直接复用
+_COMBINED_LLM = cached_orchestrator_model.with_structured_output(
+    DiagnosisCombinedOutput, method="function_calling"
+)
+
+# Actor + Critic 融合 Prompt：诊断与自审合并成一次结构化调用，
+# 比 Actor -> Critic 两跳省掉一整个 LLM 往返
+_COMBINED_PROMPT_TMPL = """
+    # Role
+    You are a Senior Veterinary Diagnostician who also performs a strict self-review before responding. Your job has two stages in ONE pass:
+    Stage 1 (Diagnose): identify the SINGLE most likely medical condition based strictly on the provided Evidence.
+    Stage 2 (Review): validate your own diagnosis as a Clinical Supervisor would.
+
+    # Diagnosis Task
+    1. Analyze the patient's symptoms against the Evidence.
+    2. Identify the ONE condition that best matches the symptom pattern.
+    3. Even if multiple conditions are possible, pick the one with the strongest evidence overlap.
+    4. Formulate professional advice.
+
+    # Diagnosis Constraints
+    - IF the evidence contradicts the symptoms (e.g., evidence says "Cat" but patient is "Dog"), ignore that evidence.
+    - IF no sufficient evidence exists to make a match, admit it in the reasoning.
+
+    # Review Criteria (Pass/Fail)
+    1. **Hallucination Check**: Does the 'Condition' actually appear in or is strongly inferred from the 'Retrieved Evidence'? If the evidence is irrelevant, you must REJECT (is_approved=false).
+    2. **Symptom Match**: Is the diagnosis logically consistent with the Patient Symptoms?
+    3. **Safety**: Does the advice include necessary disclaimers (e.g., "See a vet")?
+
+    # Patient Profile
+    - Species: {species}
+    - Breed: {breed}
+    - Age: {age}
+    - Reported Symptoms: {symptoms}
+
+    # Evidence (Retrieved Medical Records)
+    {evidence}
+
+    # Output Requirements
+    - reasoning: You can write this in English or {user_lang}, whichever is more precise.
+    - If APPROVED: final_response_to_user is a warm, professional response in {user_lang} including the condition name and the reasoning.
+    - IF REJECTED: final_response_to_user is a polite refusal in {user_lang} stating that the system cannot determine the cause based on current data, recommending a vet visit.
+    """
+
+
+async def diagnosis_combined_node(state: DiagnosisState):
+    """
+    融合节点：一次调用完成 Actor 诊断 + Critic 审核，输出最终用户消息。
+    """
+    logger.info("--- Entering Diagnosis Combined Node (Actor+Critic fused) ---")
+
+    # 1. 获取输入
+    profile = state.get("pet_profile")
+    view = state.get("pet_profile_view") or ProfileView.from_profile(profile)
+    retrieved_docs_str = state.get("retrieved_docs_str", "")
+
+    # 守卫逻辑：没有检索到文档，无法诊断，直接兜底
+    if not retrieved_docs_str:
+        logger.warning("No docs retrieved. Cannot diagnose.")
+        fallback_msg = "I'm sorry, I couldn't process the medical records to provide a diagnosis at this time. Please consult a veterinarian."
+        return {"messages": [AIMessage(content=fallback_msg, name="VeterinaryAgent")]}
+
+    user_lang = view.language
+
+    # 2. 构造 Prompt
+    combined_prompt = _COMBINED_PROMPT_TMPL.format_map({
+        "species": view.species,
+        "breed": view.breed,
+        "age": view.age,
+        "symptoms": view.symptoms_joined,
+        "evidence": retrieved_docs_str,
+        "user_lang": user_lang,
+    })
+
+    # 3. 调用 LLM
+    try:
+        response: DiagnosisCombinedOutput = await asyncio.to_thread(
+            _COMBINED_LLM.invoke, [SystemMessage(content=combined_prompt)]
+        )
+
+        logger.info(
+            f"Combined Diagnosis: {response.most_likely_condition} | "
+            f"Approved={response.is_approved} | Reason: {response.critique}"
+        )
+
+        # 4. 后台预取追问检索 (treatment/prognosis)，藏在用户阅读回复的间隙里
+        if response.is_approved:
+            schedule_speculative_prefetch(
+                response.most_likely_condition, view.species
+            )
+
+        # 5. 更新 State
+        return {
+            "messages": [AIMessage(content=response.final_response_to_user, name="VeterinaryAgent")]
+        }
+
+    except Exception as e:
+        logger.error(f"Combined Diagnosis Logic Failed: {e}")
+        return {
+            "messages": [AIMessage(content="System Error during diagnosis. Please consult a vet.", name="System")]
+        }
@@ -1,12 +1,46 @@
+import asyncio
 import logging
 from langchain_core.messages import SystemMessage, AIMessage # <--- 确保导入 AIMessage
 from state.diagnosis import DiagnosisState
-from model.orchestrator import orchestrator_model
-from state.diagnosis import DiagnosisCriticOutput, DiagnosisActorOutput # 确保路径正确
+from state.pet_profile import ProfileView
+from model.cached import cached_orchestrator_model
+from state.diagnosis import DiagnosisCriticOutput, DiagnosisActorOutput, DIAGNOSIS_ACTOR_ADAPTER # 确保路径正确
+from agents.diagnosis_retriever import schedule_speculative_prefetch
 
 logger = logging.getLogger(__name__)
 
-def diagnosis_critic_node(state: DiagnosisState):
+# 结构化绑定常量：import 时构建一次，节点直接复用
+_CRITIC_LLM = cached_orchestrator_model.with_structured_output(
+    DiagnosisCriticOutput, method="function_calling"
+)
+
+# Prompt 模板常量：固定前缀 (Role/Criteria) 在前、变量段在后，
+# 字节稳定的前缀才能吃到服务端 prompt 缓存
+_CRITIC_PROMPT_TMPL = """
+    # Role
+    You are a Veterinary Clinical Supervisor. Your job is to validate the diagnosis made by a junior doctor (Actor).
+
+    # Validation Criteria (Pass/Fail)
+    1. **Hallucination Check**: Does the 'Condition' actually appear in or is strongly inferred from the 'Retrieved Evidence'? If the evidence is irrelevant, you must REJECT.
+    2. **Symptom Match**: Is the diagnosis logically consistent with the Patient Symptoms?
+    3. **Safety**: Does the advice include necessary disclaimers (e.g., "See a vet")?
+
+    # Context
+    - Patient Symptoms: {symptoms} (Species: {species}; Breed: {breed})
+    - Retrieved Evidence:
+    {evidence}
+
+    # Actor's Proposed Diagnosis
+    - Condition: {condition}
+    - Reasoning: {reasoning}
+    - Proposed Advice: {advice}
+
+    # Task
+    - If APPROVED: Rewrite the 'Proposed Advice' into a warm, professional response for the user in {user_lang}. Include the Condition name and the reasoning.
+    - IF REJECTED: Write a polite refusal message in {user_lang} stating that the system cannot determine the cause based on current data, and recommend seeing a vet.
+    """
+
+async def diagnosis_critic_node(state: DiagnosisState):
     """
     Critic Node: 审核 Actor 的诊断是否存在幻觉或风险。
     """
@@ -14,7 +48,8 @@ def diagnosis_critic_node(state: DiagnosisState):
     
     # 1. 获取输入
     profile = state.get("pet_profile")
-    retrieved_docs = state.get("retrieved_docs", [])
+    view = state.get("pet_profile_view") or ProfileView.from_profile(profile)
+    retrieved_docs_str = state.get("retrieved_docs_str", "")
     draft = state.get("diagnosis_draft")
     
     # 守卫逻辑：如果 Actor 挂了没有生成草稿，直接兜底
@@ -23,50 +58,45 @@ def diagnosis_critic_node(state: DiagnosisState):
         # [修改] 使用 AIMessage，代表这是 AI 说的话
         return {"messages": [AIMessage(content=fallback_msg, name="VeterinaryAgent")]}
 
-    # 2. 还原 Actor 对象
-    # [安全访问] 使用 getattr 或者默认值，防止旧数据报错
-    user_lang = getattr(profile, "language", "English")
-    
-    actor_output = DiagnosisActorOutput(**draft)
-
-    # 3. 构造 Prompt
-    critic_prompt = f"""
-    # Role
-    You are a Veterinary Clinical Supervisor. Your job is to validate the diagnosis made by a junior doctor (Actor).
-
-    # Context
-    - Patient Symptoms: {profile.symptoms} (Species: {getattr(profile.species, "value", str(profile.species))}; Breed: {getattr(profile.breed, "value", str(profile.breed))})
-    - Retrieved Evidence:
-    {chr(10).join(retrieved_docs)} 
-
-    # Actor's Proposed Diagnosis
-    - Condition: {actor_output.most_likely_condition}
-    - Reasoning: {actor_output.reasoning}
-    - Proposed Advice: {actor_output.advice_for_owner}
+    # 2. 获取 Actor 对象 (State 里直接就是 DiagnosisActorOutput，无需重建)
+    user_lang = view.language
 
-    # Validation Criteria (Pass/Fail)
-    1. **Hallucination Check**: Does the 'Condition' actually appear in or is strongly inferred from the 'Retrieved Evidence'? If the evidence is irrelevant, you must REJECT.
-    2. **Symptom Match**: Is the diagnosis logically consistent with the Patient Symptoms? 
-    3. **Safety**: Does the advice include necessary disclaimers (e.g., "See a vet")?
+    actor_output = draft
+    if isinstance(draft, dict):
+        # 兼容旧 checkpoint 里序列化成 dict 的草稿：走预编译的模块级
+        # TypeAdapter，比 model_validate 少一次 schema 派发，
+        # 且比 model_construct 多一层防御 (旧格式字段能被规整)
+        actor_output = DIAGNOSIS_ACTOR_ADAPTER.validate_python(draft)
 
-    # Task
-    - If APPROVED: Rewrite the 'Proposed Advice' into a warm, professional response for the user in {user_lang}. Include the Condition name and the reasoning.
-    - IF REJECTED: Write a polite refusal message in {user_lang} stating that the system cannot determine the cause based on current data, and recommend seeing a vet.
-    """
+    # 3. 构造 Prompt
+    critic_prompt = _CRITIC_PROMPT_TMPL.format_map({
+        "symptoms": view.symptoms_joined,
+        "species": view.species,
+        "breed": view.breed,
+        "evidence": retrieved_docs_str,
+        "condition": actor_output.most_likely_condition,
+        "reasoning": actor_output.reasoning,
+        "advice": actor_output.advice_for_owner,
+        "user_lang": user_lang,
+    })
 
     # 4. 调用 LLM
     try:
-        critic_model = orchestrator_model.with_structured_output(DiagnosisCriticOutput)
-        
-        critic_response: DiagnosisCriticOutput = critic_model.invoke([
-            SystemMessage(content=critic_prompt)
-        ])
+        critic_response: DiagnosisCriticOutput = await asyncio.to_thread(
+            _CRITIC_LLM.invoke, [SystemMessage(content=critic_prompt)]
+        )
         
         logger.info(f"Critic Decision: Approved={critic_response.is_approved} | Reason: {critic_response.critique}")
         
         # 5. 生成最终消息
         final_msg = critic_response.final_response_to_user
-        
+
+        # 后台预取追问检索 (treatment/prognosis)，藏在用户阅读回复的间隙里
+        if critic_response.is_approved:
+            schedule_speculative_prefetch(
+                actor_output.most_likely_condition, view.species
+            )
+
         # 6. 更新 State
         return {
             "messages": [AIMessage(content=final_msg, name="VeterinaryAgent")]
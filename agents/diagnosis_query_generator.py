@@ -1,18 +1,36 @@
+import asyncio
 import logging
+
+import numpy as np
 from langchain_core.messages import SystemMessage
 
+from common.semantic_cache import SemanticCache
+from agents.diagnosis_retriever import get_retriever
+
 # 注意：这里导入了刚才新建的 schema
 from state.diagnosis import MultiViewSearchQueries
 from state.diagnosis import DiagnosisState
+from state.pet_profile import ProfileView
 
-# 复用 orchestrator_model (DeepSeek-Chat, Temp=0)，因为它指令遵循能力强且便宜
-from model.orchestrator import orchestrator_model
+# 复用 orchestrator_model (DeepSeek-Chat, Temp=0)，因为它指令遵循能力强且便宜；
+# 走缓存包装：相同 Profile 生成的 Prompt 逐字节相同，命中免一次 LLM 调用
+from model.cached import cached_orchestrator_model
 
 
 logger = logging.getLogger(__name__)
 
+# 语义缓存：近似档案 (同物种/品种、症状措辞略有出入) 的档案摘要 embedding
+# 余弦相似度 >= 0.95 时直接复用上次生成的双视角 Query，免一次 LLM 往返。
+# 复用检索节点同一个 dense embedder 产生向量。
+_query_cache = SemanticCache(threshold=0.95, max_entries=128, ttl=600.0)
+
+# 结构化绑定常量：import 时构建一次，节点直接复用
+_QUERY_GEN_LLM = cached_orchestrator_model.with_structured_output(
+    MultiViewSearchQueries, method="function_calling"
+)
 
-def diagnostic_query_generator_node(state: DiagnosisState):
+
+async def diagnostic_query_generator_node(state: DiagnosisState):
     logger.info("--- Entering Query Generator Node (Dual-View) ---")
 
     # 1. 获取上下文
@@ -21,9 +39,25 @@ def diagnostic_query_generator_node(state: DiagnosisState):
         logger.error("PetProfile is empty. Cannot generate queries.")
         return {"search_queries": []}
 
-    # 2. 准备 Prompt 数据
-    # 处理 Enum (如果 species 是 Enum 对象则取 value，否则转字符串)
-    species_val = getattr(profile.species, "value", str(profile.species))
+    # 2. 准备 Prompt 数据 (预格式化视图在 Extractor 侧算好)
+    view = state.get("pet_profile_view") or ProfileView.from_profile(profile)
+
+    # 2.5 语义缓存探测：embed 一次档案摘要 (~ms) 换掉一次 LLM 调用 (~s)
+    profile_key = f"{view.species} | {view.breed} | {view.age} | {view.symptoms_joined}"
+    profile_vec = None
+    try:
+        retriever = get_retriever()
+        profile_vec = np.asarray(
+            await asyncio.to_thread(retriever._get_dense_vector, profile_key),
+            dtype=np.float32,
+        )
+        # 与检索缓存一致按物种分区：异种但措辞雷同的档案绝不互相命中
+        cached_queries = _query_cache.get(profile_vec, namespace=view.species)
+        if cached_queries is not None:
+            logger.info("Semantic cache hit for generated queries.")
+            return {"search_queries": list(cached_queries), "query_rewrite_count": 0}
+    except Exception as e:
+        logger.warning(f"Query cache lookup failed (continuing without cache): {e}")
 
     # 3. 构造 System Prompt (精简版：只保留 Strategies 1 & 2)
     system_prompt = f"""
@@ -31,10 +65,10 @@ def diagnostic_query_generator_node(state: DiagnosisState):
     You are a Search Query Specialist for a Veterinary RAG System.
     
     # Input Data (Pet Profile)
-    - Species: {species_val}
-    - Breed: {profile.breed}
-    - Age: {profile.age}
-    - Symptoms: {profile.symptoms}
+    - Species: {view.species}
+    - Breed: {view.breed}
+    - Age: {view.age}
+    - Symptoms: {view.symptoms_joined}
     
     # Task
     Generate 2 specific types of search queries to ensure we find relevant medical records.
@@ -55,14 +89,10 @@ def diagnostic_query_generator_node(state: DiagnosisState):
     Strictly output the JSON object defined by the schema.
     """
 
-    # 4. 绑定结构化输出
-    # 这一步会自动强制 LLM 输出符合 MultiViewSearchQueries 定义的 JSON
-    query_generator = orchestrator_model.with_structured_output(MultiViewSearchQueries)
-
     try:
-        # 5. 调用 LLM
-        result: MultiViewSearchQueries = query_generator.invoke(
-            [SystemMessage(content=system_prompt)]
+        # 4/5. 调用结构化 LLM (绑定在模块级做好)
+        result: MultiViewSearchQueries = await asyncio.to_thread(
+            _QUERY_GEN_LLM.invoke, [SystemMessage(content=system_prompt)]
         )
 
         # 6. 提取结果
@@ -70,11 +100,13 @@ def diagnostic_query_generator_node(state: DiagnosisState):
 
         logger.info(f"Generated Dual-View Queries: {generated_queries}")
 
-        # 7. 更新 State
+        # 7. 写入语义缓存并更新 State
+        if profile_vec is not None:
+            _query_cache.put(profile_vec, generated_queries, namespace=view.species)
         return {"search_queries": generated_queries, "query_rewrite_count": 0}
 
     except Exception as e:
         logger.error(f"Query Generation Failed: {e}")
         # 兜底策略：简单拼接
-        fallback_query = f"{species_val} {', '.join(profile.symptoms)}"
+        fallback_query = f"{view.species} {view.symptoms_joined}"
         return {"search_queries": [fallback_query], "query_rewrite_count": 0}
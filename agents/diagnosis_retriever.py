@@ -1,31 +1,115 @@
+import asyncio
 import logging
-from typing import List
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from common.semantic_cache import SemanticCache
+from common.species_enum import species_str
 from state.diagnosis import DiagnosisState
 from rag.impl.retriever import Retriever
 
-# 假设我们在 main.py 或某个地方初始化了全局的 retriever 实例
-# 或者在这里 lazy init (生产环境通常通过依赖注入传递)
-# 为了 Demo 简单，我们这里假设能引用到 retriever 实例
-# 更好的做法是在 graph config 里传递 retriever，或者在这里实例化
-
 logger = logging.getLogger(__name__)
 
-# 初始化 Retriever (注意：在实际生产中，这通常是在系统启动时完成的单例)
-# 这里为了代码独立性，演示一下初始化，实际应该复用全局实例
+# 语义缓存：追问轮次间的 Query 往往只差一两个症状词，
+# 余弦相似度 >= 0.95 直接复用上次的检索结果，省掉整条 Qdrant + Rerank 链路
+_CACHE_TTL = 600.0
+_semantic_cache = SemanticCache(threshold=0.95, max_entries=256, ttl=_CACHE_TTL)
+
+# Retriever 连接配置 (模块级常量，所有节点调用共享同一份)
+_RETRIEVER_URL = "http://localhost:6333"
+_RETRIEVER_COLLECTION = "pet_health_hybrid"
+_RETRIEVER_TIMEOUT = 5.0
+
+# 文档格式化模板 (模块级常量，避免循环内重复拼 f-string 产生临时对象)
+_DOC_TMPL = (
+    "Doc ID: {id}\n"
+    "Source: {source}\n"
+    "Species: {species}\n"
+    "Breed: {breed}\n"
+    "Symptoms: {symptoms}\n"
+    "Symptom_keywords: {keywords}\n"
+    "Diagnosis: {diagnosis}\n"
+)
+
+# 模型缓存目录固定为绝对路径：不随 cwd 漂移，多个进程/部署共享同一份权重文件，
+# 避免每个 worker 各自重新下载。ONNX Runtime 以 mmap 方式加载权重，
+# 多进程 (fork) 场景下页缓存/COW 让权重在物理内存里只占一份。
+_MODEL_CACHE_DIR = os.path.abspath(
+    os.getenv("RAG_MODEL_CACHE_DIR", "./rag/model_cache")
+)
+
+# 全局单例：Embedding/Reranker 权重加载一次常驻内存，Qdrant 连接复用
+# (进程启动时可调用一次 get_retriever() 提前 warm-up；多进程部署时应在
+#  master 进程 warm-up 后再 fork worker，权重页随 COW 共享)
 _retriever_instance = None
+_retriever_lock = threading.Lock()
 
 
-def get_retriever():
+def get_retriever() -> Retriever:
     global _retriever_instance
     if _retriever_instance is None:
-        # 确保路径和你项目一致
-        _retriever_instance = Retriever(
-            model_cache_dir="./rag/model_cache", use_reranker=True
-        )
+        with _retriever_lock:
+            # double-checked locking: 防止并发首次调用重复加载模型
+            if _retriever_instance is None:
+                _retriever_instance = Retriever(
+                    url=_RETRIEVER_URL,
+                    collection_name=_RETRIEVER_COLLECTION,
+                    timeout=_RETRIEVER_TIMEOUT,
+                    model_cache_dir=_MODEL_CACHE_DIR,
+                    use_reranker=True,
+                )
     return _retriever_instance
 
 
-def diagnosis_retriever_node(state: DiagnosisState):
+# 投机预取：诊断结论发出后，用户大概率追问治疗/预后。趁用户阅读回复的间隙
+# 在后台把这些 Query 的检索结果灌进语义缓存，下一轮命中即免整条检索链路。
+_FOLLOWUP_QUERY_TMPLS = (
+    "treatment for {condition}",
+    "prognosis for {condition}",
+)
+# condition -> 上次预取时间。预取结果在语义缓存里只活 _CACHE_TTL，
+# 去重记录也要跟着过期，否则缓存失效后同一 condition 永远不再预取
+_prefetched_conditions: dict = {}
+
+
+def _speculative_prefetch(condition: str, species: Optional[str]):
+    """在工作线程里跑：embed 追问 Query -> 批量检索 -> 写入语义缓存。"""
+    retriever = get_retriever()
+    queries = [tmpl.format(condition=condition) for tmpl in _FOLLOWUP_QUERY_TMPLS]
+    vecs = retriever._get_dense_vectors(queries)
+    results_lists = retriever.search_batch(
+        queries, filters={"species": species}, limit=10
+    )
+    ns = species or ""
+    for vec, results in zip(vecs, results_lists):
+        _semantic_cache.put(np.asarray(vec, dtype=np.float32), results, namespace=ns)
+
+
+def schedule_speculative_prefetch(condition: str, species: Optional[str]):
+    """Fire-and-forget 地预取 condition 的追问检索，必须在事件循环里调用。"""
+    if not condition:
+        return
+    now = time.monotonic()
+    last = _prefetched_conditions.get(condition)
+    if last is not None and now - last < _CACHE_TTL:
+        return
+    _prefetched_conditions[condition] = now
+
+    async def _runner():
+        try:
+            await asyncio.to_thread(_speculative_prefetch, condition, species)
+            logger.info(f"Speculative prefetch done for condition: '{condition}'")
+        except Exception as e:
+            logger.warning(f"Speculative prefetch failed for '{condition}': {e}")
+
+    asyncio.create_task(_runner())
+
+
+async def diagnosis_retriever_node(state: DiagnosisState):
     """
     执行检索：接收 search_queries，调用 Retriever，返回 retrieved_docs
     """
@@ -40,39 +124,54 @@ def diagnosis_retriever_node(state: DiagnosisState):
         logger.warning("No search queries found in state. Skipping retrieval.")
         return {"retrieved_docs": []}
 
+    # 关键：传入 species_filter !!
+    species_filter = None
+    if pet_profile and pet_profile.species:
+        species_filter = species_str(pet_profile.species)
+
     try:
-        retriever = Retriever(url = "http://localhost:6333", 
-                            collection_name = "pet_health_hybrid",
-                            timeout = 5.0,
-                            model_cache_dir = "./rag/model_cache",
-                            use_reranker = True)
-        all_results = []
+        retriever = get_retriever()
 
-        # 2. 执行多路检索 (Serial Execution for Demo, Parallel for Production)
-        # 因为我们采用了“全量混合”策略，每个 Query 都要查一遍
-        for q in queries:
-            # 这里的 limit 可以稍微大一点，给 Reranker 更多候选
-            # 关键：传入 species_filter !!
-            species_filter = None
-            if pet_profile and pet_profile.species:
-                # 处理 Enum 取 value 的逻辑
-                species_filter = getattr(
-                    pet_profile.species, "value", str(pet_profile.species)
-                )
+        # 2. 批量向量化：N 个 Query 一次 ONNX 前向，embedding 同时作为语义缓存 key
+        q_vecs = [
+            np.asarray(v, dtype=np.float32)
+            for v in await asyncio.to_thread(retriever._get_dense_vectors, queries)
+        ]
 
-            logger.info(f"Executing Search: '{q}' | Filter: {species_filter}")
+        # 缓存按 species 分区：跨物种的相似 Query 绝不互相命中
+        cache_ns = species_filter or ""
 
-            results = retriever.search(
-                query=q,
+        all_results = []
+        miss_queries: List[str] = []
+        miss_vecs = []
+        for q, q_vec in zip(queries, q_vecs):
+            cached = _semantic_cache.get(q_vec, namespace=cache_ns)
+            if cached is not None:
+                logger.info(f"Semantic cache hit for query: '{q}'")
+                all_results.extend(cached)
+            else:
+                miss_queries.append(q)
+                miss_vecs.append(q_vec)
+
+        # 3. 缓存未命中的 Query 走一次批量混合检索
+        # 因为我们采用了“全量混合”策略，每个 Query 都要查一遍
+        if miss_queries:
+            logger.info(f"Executing Batch Search: {miss_queries} | Filter: {species_filter}")
+            # 这里的 limit 可以稍微大一点，给 Reranker 更多候选
+            results_lists = await asyncio.to_thread(
+                retriever.search_batch,
+                miss_queries,
                 filters={"species": species_filter},
                 limit=10,  # 这里的 limit 是单次检索的召回量
             )
-            all_results.extend(results)
+            for q_vec, results in zip(miss_vecs, results_lists):
+                _semantic_cache.put(q_vec, results, namespace=cache_ns)
+                all_results.extend(results)
 
     except Exception as e:
         logger.error(f"Retrieval failed: {e}")
         # 即使失败，也尽量不要 Crash 整个流程，返回空列表让后续节点处理(比如 Query Rewrite)
-        return {"retrieved_docs": []}
+        return {"retrieved_docs": [], "retrieved_docs_str": ""}
 
     # 3. 结果去重 (Deduplication)
     # 多个 Query 可能会搜出同一个文档，按 ID 去重
@@ -95,27 +194,25 @@ def diagnosis_retriever_node(state: DiagnosisState):
     # 将 SearchResult 对象转化为 LLM 易读的字符串格式
     formatted_docs = []
     for doc in final_docs:
-        # 组装一个清晰的文档字符串
-        meta = doc.metadata or {}
-        keywords_raw = meta.get("symptom_keywords", [])
-        if isinstance(keywords_raw, list):
-            keywords_str = ", ".join(keywords_raw)
-        else:
-            keywords_str = str(keywords_raw)
-        doc_str = (
-            f"Doc ID: {doc.id}\n"
-            f"Source: {doc.source}\n" # SearchResult 类本身有 source 属性，所以 doc.source 是对的
-            f"Species: {meta.get('species', 'unknown')}\n"       # <--- 修正
-            f"Breed: {meta.get('specific_breed', 'unknown')}\n"  # <--- 修正
-            f"Symptoms: {doc.text}\n"
-            f"Symptom_keywords: {keywords_str}\n"                 # <--- 修正 (单引号问题也在此解决)
-            f"Diagnosis: {meta.get('condition', 'unknown')}\n"    # <--- 修正
-        )
-        formatted_docs.append(doc_str)
+        m = doc.metadata or {}
+        kw = m.get("symptom_keywords")
+        formatted_docs.append(_DOC_TMPL.format(
+            id=doc.id,
+            source=doc.source,  # SearchResult 类本身有 source 属性
+            species=m.get("species", "unknown"),
+            breed=m.get("specific_breed", "unknown"),
+            symptoms=doc.text,
+            keywords=", ".join(kw) if isinstance(kw, list) else str(kw or ""),
+            diagnosis=m.get("condition", "unknown"),
+        ))
 
     logger.info(
         f"Retrieval Complete. Found {len(formatted_docs)} unique relevant docs."
     )
 
     # 6. 更新 State
-    return {"retrieved_docs": formatted_docs}
+    # retrieved_docs_str: 拼接一次，Actor/Critic 共用；列表保留给需要逐条处理的消费方
+    return {
+        "retrieved_docs": formatted_docs,
+        "retrieved_docs_str": "\n\n".join(formatted_docs),
+    }
@@ -1,7 +1,9 @@
+import asyncio
 import json
 from typing import Optional
 from pydantic import BaseModel, field_validator, ValidationError
 from state.diagnosis import DiagnosisState, PetProfile
+from state.pet_profile import ProfileView
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from model.extractor import extractor_model
 
@@ -9,6 +11,11 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 结构化绑定常量：import 时构建一次，节点直接复用
+_EXTRACTOR_LLM = extractor_model.with_structured_output(
+    PetProfile, method="function_calling"
+)
+
 
 def merge_profiles(current: PetProfile, new_delta: PetProfile) -> PetProfile:
     """
@@ -24,27 +31,32 @@ def merge_profiles(current: PetProfile, new_delta: PetProfile) -> PetProfile:
             if updated_data.get(key) is None:
                 updated_data[key] = []
 
+            # [去重] 用 set 做 O(1) 存在性判断，避免对列表做 O(n) 扫描
+            existing = set(updated_data[key])
+
             # [防御] 确保 new_value 是列表，防止 None 进来遍历报错
             if isinstance(new_value, list):
                 for item in new_value:
-                    if not isinstance(item, str):
+                    if type(item) is not str:
                         continue
 
                     # [清洗] 去除空格，保证匹配准确
                     clean_item = item.strip()
 
                     # [去重] 只有不存在时才追加
-                    if clean_item and clean_item not in updated_data[key]:
+                    if clean_item and clean_item not in existing:
                         updated_data[key].append(clean_item)
+                        existing.add(clean_item)
 
         # 其他字段: 覆盖模式
         else:
             updated_data[key] = new_value
 
-    return PetProfile(**updated_data)
+    # 两份输入都已经过校验，合并结果直接 model_construct 跳过再校验
+    return PetProfile.model_construct(**updated_data)
 
 
-def extractor_node(state: DiagnosisState):
+async def extractor_node(state: DiagnosisState):
     """
     Inquiry Node: Delta Extraction + Python Merging
     """
@@ -58,7 +70,8 @@ def extractor_node(state: DiagnosisState):
     if len(messages) > 1:
         last_bot_question = messages[-2].content
     
-    current_state_json = current_profile.model_dump_json(indent=2)
+    # 紧凑序列化即可，LLM 不需要 pretty-print 的缩进
+    current_state_json = current_profile.model_dump_json()
     # --- Step 1: 提取增量信息 (Delta Extraction) ---
     # Prompt 强调只提取“本次”对话中的新信息
     extraction_prompt = f"""
@@ -121,13 +134,21 @@ def extractor_node(state: DiagnosisState):
     Return a strictly valid JSON object matching the `PetProfile` schema.
     """
 
-    extractor = extractor_model.with_structured_output(PetProfile)
     # 这里我们只把 Prompt 发给 LLM，不发之前的 Profile，防止它幻觉
-    delta_profile = extractor.invoke([SystemMessage(content=extraction_prompt)])
+    delta_profile = await asyncio.to_thread(
+        _EXTRACTOR_LLM.invoke, [SystemMessage(content=extraction_prompt)]
+    )
     # --- Step 2: 在 Python 侧进行合并 (Safe Merging) ---
     if delta_profile is None:
         logger.warning("Extractor returned None. Skipping update to prevent crash.")
-        return {"pet_profile": current_profile}
+        return {
+            "pet_profile": current_profile,
+            "pet_profile_view": ProfileView.from_profile(current_profile),
+        }
     updated_profile = merge_profiles(current_profile, delta_profile)
     logger.info(f"updated_profile summarize:\n{updated_profile.summarization}\n")
-    return {"pet_profile": updated_profile}
+    # 视图只在这里算一次，Actor/Critic/QueryGen 直接消费
+    return {
+        "pet_profile": updated_profile,
+        "pet_profile_view": ProfileView.from_profile(updated_profile),
+    }
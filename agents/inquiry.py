@@ -1,4 +1,4 @@
-import json
+import asyncio
 from typing import Optional, List
 from pydantic import BaseModel, field_validator, ValidationError
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
@@ -6,10 +6,6 @@ from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, Base
 from state.diagnosis import DiagnosisState
 from state.agent_status import AgentStatus
 
-# 确保引入了你移动后的 SpeciesEnum
-from common.species_enum import SpeciesEnum
-
-# 如果 state.pet_profile 里还没有引入 SpeciesEnum，请确保先完成上一步的 State 修改
 from state.pet_profile import PetProfile
 from model.inquiry import inquiry_model
 
@@ -17,8 +13,7 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-
-def inquiry_node(state: DiagnosisState):
+async def inquiry_node(state: DiagnosisState):
     logger.info("entering inquiry_node")
     agent_status = "agent_status"
     updated_profile = state.get("pet_profile", PetProfile())
@@ -35,7 +30,7 @@ def inquiry_node(state: DiagnosisState):
         # --- 修改点 2: 特殊处理 Species 的 Unknown 状态 ---
         # 如果是 None，或者显式为 "unknown"，都视为缺失
         if field == "species":
-            if not value or value == SpeciesEnum.UNKNOWN:
+            if not value or value == "unknown":
                 missing_mandatory.append(field)
                 continue
 
@@ -75,10 +70,8 @@ def inquiry_node(state: DiagnosisState):
             "messages": [],
         }
 
-    schema_json = json.dumps(
-        PetProfile.model_json_schema(), indent=2, ensure_ascii=False
-    )
-    current_state_json = updated_profile.model_dump_json(indent=2)
+    # 紧凑序列化即可，LLM 不需要 pretty-print 的缩进
+    current_state_json = updated_profile.model_dump_json()
 
     # 1. Format History (The Context)
     # Convert message objects to a readable string format
@@ -142,7 +135,10 @@ def inquiry_node(state: DiagnosisState):
     ### Critical Language Rule
     **Language Mirroring**: Respond in the **exact same language** as the User's last message in `<conversation_history>`.
     """
-    question_response = inquiry_model.invoke([SystemMessage(content=ask_prompt)])
+    # LLM 调用放到线程池，不阻塞事件循环
+    question_response = await asyncio.to_thread(
+        inquiry_model.invoke, [SystemMessage(content=ask_prompt)]
+    )
 
     if missing_mandatory:
         return {
@@ -1,3 +1,5 @@
+import re
+
 from state.orchestrator import OrchestratorState
 from state.agent_status import AgentStatus
 from state.user_intent import IntentType, UserIntentOutput
@@ -7,31 +9,11 @@ from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, Base
 import logging
 logger = logging.getLogger(__name__)
 
-def orchestrator_node(state: OrchestratorState):
-    """
-    main agent：intent recognition
-    """
-    agent_status = "agent_status"
-    user_intent = "user_intent"
-    
-    status = state.get(agent_status, "")
-    if status == AgentStatus.INQUIRY:
-        return {}
-    elif status == AgentStatus.DIAGNOSIS:
-        return {}
-    elif status == AgentStatus.TREATMENT:
-        return {}
-    elif status == AgentStatus.KNOWLEDGE:
-        return {}
-    
-    messages = state["messages"]
-
-    # intent recognition
-    last_user_message = messages[-1].content
-    
-    # structured LLM response for intent recognition
-    structured_llm = orchestrator_model.with_structured_output(UserIntentOutput)
-    system_prompt = """
+# 以下全是常量：Prompt 字符串 / SystemMessage / 结构化 wrapper 在 import 时
+# 构建一次，每个请求只需要拼一条 HumanMessage。
+# DeepSeek 的前缀缓存按字节匹配，静态 SystemMessage 在前 + 逐字节稳定的
+# Prompt 才能稳定命中，所以 IntentType 占位符在 import 时就替换成字面值。
+_SYSTEM_PROMPT_TMPL = """
     # Role Definition
     You are the **Master Orchestrator** for a professional Online Pet Agent. 
     Your SOLE responsibility is to analyze the user's input and route them to the correct sub-workflow.
@@ -86,14 +68,86 @@ def orchestrator_node(state: OrchestratorState):
     "intent": "String (Must be one of the Category IDs above)"
     }
     """
+
+# 原 Prompt 是普通字符串，"{IntentType.XXX}" 其实是原样发给模型的占位符文本；
+# 这里替换为枚举字面值 (如 "intent_diagnosis")，模型返回的 intent 才能对得上
+_SYSTEM_PROMPT = _SYSTEM_PROMPT_TMPL
+for _member in IntentType:
+    _SYSTEM_PROMPT = _SYSTEM_PROMPT.replace(
+        f"{{IntentType.{_member.name}}}", _member.value
+    )
+
+_SYSTEM_MSG = SystemMessage(content=_SYSTEM_PROMPT)
+
+_STRUCTURED_LLM = orchestrator_model.with_structured_output(
+    UserIntentOutput, method="function_calling"
+)
+
+# 关键词快路径：纯寒暄 / 明显症状描述不值得一次几百 ms 的 LLM 往返，
+# 用预编译正则在微秒级内出结果。词表取自上面 Prompt 里枚举的 Key Signals。
+# 只对无歧义的情况短路，其余 (含治疗/知识类、症状+用药混合) 仍交给 LLM。
+_CHIT_CHAT_RE = re.compile(
+    r"^\s*(?:hi|hello|hey|are you there|你好|您好|在吗|在不在)\s*[!！.。?？~]*\s*$",
+    re.IGNORECASE,
+)
+_DIAGNOSIS_RE = re.compile(
+    r"vomit|throwing up|blood|limp|not eating|sick|hair loss|diarrhea|letharg"
+    r"|吐了|呕吐|拉稀|腹泻|便血|没精神|不吃",
+    re.IGNORECASE,
+)
+_TREATMENT_RE = re.compile(
+    r"dosage|dose|side effect|post-op|post op|vaccine|insulin|medicine|medication"
+    r"|药量|用药|疫苗|术后|副作用",
+    re.IGNORECASE,
+)
+
+
+def _match_fast_intent(text: str):
+    """无需 LLM 即可确定的意图返回 IntentType，有歧义时返回 None 走 LLM。"""
+    if _CHIT_CHAT_RE.match(text):
+        return IntentType.CHIT_CHAT
+    # 症状词命中且不含用药词时才短路：症状+用药混合的优先级规则交给 LLM 判
+    if _DIAGNOSIS_RE.search(text) and not _TREATMENT_RE.search(text):
+        return IntentType.INTENT_DIAGNOSIS
+    return None
+
+
+# 已在子流程中的状态直接放行，不再走意图识别
+_PASSTHROUGH_STATUSES = frozenset({
+    AgentStatus.INQUIRY,
+    AgentStatus.DIAGNOSIS,
+    AgentStatus.TREATMENT,
+    AgentStatus.KNOWLEDGE,
+})
+
+
+def orchestrator_node(state: OrchestratorState):
+    """
+    main agent：intent recognition
+    """
+    agent_status = "agent_status"
+    user_intent = "user_intent"
+
+    if state.get(agent_status, "") in _PASSTHROUGH_STATUSES:
+        return {}
+
+    messages = state["messages"]
+
+    # intent recognition
+    last_user_message = messages[-1].content
     
-    response = structured_llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=last_user_message)
-    ])
-    
-    intent = response.intent
-    
+    # 快路径：寒暄/明显症状直接出结果，省掉整次分类调用
+    intent = _match_fast_intent(last_user_message)
+    if intent is not None:
+        logger.info(f"Fast-path intent match: {intent}")
+    else:
+        # structured LLM response for intent recognition
+        response = _STRUCTURED_LLM.invoke([
+            _SYSTEM_MSG,
+            HumanMessage(content=last_user_message)
+        ])
+        intent = response.intent
+
     # 如果意图是诊断，我们初始化追问流程
     if intent == IntentType.INTENT_DIAGNOSIS:
         return {
@@ -0,0 +1,132 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    语义缓存：以查询的 Embedding 为 key，余弦相似度 >= threshold 即命中。
+
+    - LSH 随机投影分桶 (np.sign(W @ q))：查找只扫描同桶条目，O(bucket) 而非 O(N)
+    - LRU 淘汰 (OrderedDict) + TTL 过期 (time.monotonic)
+    - 线程安全：检索节点可能在线程池里并发调用
+    - namespace：拼进桶 key 做硬隔离 (如按 species 分区，
+      防止 "cat vomiting" 命中 "dog vomiting" 的检索结果)
+    - 向量以对称 int8 量化存储 (每向量一个 scale)：内存省 4x，
+      打分时整型点积再乘 scale 还原，余弦相似度在该维度下误差可忽略
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 256,
+        ttl: float = 600.0,
+        n_bits: int = 8,
+        seed: int = 42,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.n_bits = n_bits
+        self._seed = seed
+
+        # 投影矩阵 W ~ N(0,1)，首次插入时才知道向量维度，lazy 初始化
+        self._planes: Optional[np.ndarray] = None
+
+        # entry_id -> (bucket_key, int8_vec, scale, value, timestamp)
+        self._entries: "OrderedDict[int, Tuple[bytes, np.ndarray, float, Any, float]]" = OrderedDict()
+        # bucket_key -> [entry_id, ...]
+        self._buckets: Dict[bytes, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vec: Any) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm > 0.0 else v
+
+    @staticmethod
+    def _quantize(v: np.ndarray) -> Tuple[np.ndarray, float]:
+        """对称 int8 量化：scale = max|v|/127，点积 ≈ (q1·q2)·s1·s2"""
+        scale = float(np.abs(v).max()) / 127.0 if v.size else 1.0
+        if scale <= 0.0:
+            scale = 1.0
+        return np.round(v / scale).astype(np.int8), scale
+
+    def _bucket_key(self, vec: np.ndarray) -> bytes:
+        if self._planes is None:
+            rng = np.random.default_rng(self._seed)
+            self._planes = rng.standard_normal(
+                (self.n_bits, vec.shape[0])
+            ).astype(np.float32)
+        bits = (self._planes @ vec) >= 0.0
+        return np.packbits(bits).tobytes()
+
+    def _evict_entry(self, entry_id: int) -> None:
+        bucket_key = self._entries.pop(entry_id)[0]
+        ids = self._buckets.get(bucket_key)
+        if ids is not None:
+            try:
+                ids.remove(entry_id)
+            except ValueError:
+                pass
+            if not ids:
+                del self._buckets[bucket_key]
+
+    def get(self, vec: Any, namespace: str = "") -> Optional[Any]:
+        """相似度最高且 >= threshold 的条目命中，否则返回 None"""
+        q = self._normalize(vec)
+        now = time.monotonic()
+        with self._lock:
+            bucket_key = namespace.encode("utf-8") + b"\x00" + self._bucket_key(q)
+            ids = self._buckets.get(bucket_key)
+            if not ids:
+                return None
+
+            live_ids: List[int] = []
+            live_vecs: List[np.ndarray] = []
+            live_scales: List[float] = []
+            for entry_id in list(ids):
+                _, entry_vec, scale, _, ts = self._entries[entry_id]
+                if now - ts > self.ttl:
+                    self._evict_entry(entry_id)
+                    continue
+                live_ids.append(entry_id)
+                live_vecs.append(entry_vec)
+                live_scales.append(scale)
+
+            if not live_ids:
+                return None
+
+            # 同桶存活条目堆成 (N, D) int8 矩阵，一次整型 GEMV 算完全部
+            # 点积，再逐行乘 scale 还原余弦相似度 (向量已归一化)
+            q_int8, q_scale = self._quantize(q)
+            dots = np.stack(live_vecs).astype(np.int32) @ q_int8.astype(np.int32)
+            scores = dots * (np.asarray(live_scales, dtype=np.float32) * q_scale)
+            best = int(np.argmax(scores))
+            if float(scores[best]) < self.threshold:
+                return None
+
+            best_id = live_ids[best]
+            # LRU touch
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][3]
+
+    def put(self, vec: Any, value: Any, namespace: str = "") -> None:
+        q = self._normalize(vec)
+        with self._lock:
+            bucket_key = namespace.encode("utf-8") + b"\x00" + self._bucket_key(q)
+            q_int8, scale = self._quantize(q)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (bucket_key, q_int8, scale, value, time.monotonic())
+            self._buckets.setdefault(bucket_key, []).append(entry_id)
+
+            # LRU 淘汰最旧条目
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._evict_entry(oldest_id)
@@ -1,11 +1,29 @@
-from enum import Enum
-
-class SpeciesEnum(str, Enum):
-    BIRD = "bird"
-    CAT = "cat"
-    DOG = "dog"
-    FERRET = "ferret"
-    GUINEA_PIG = "guinea_pig"
-    HAMSTER = "hamster"
-    RABBIT = "rabbit"
-    UNKNOWN = "unknown"
\ No newline at end of file
+import functools
+from typing import Literal, get_args
+
+# 原 SpeciesEnum(str, Enum) 改为 Literal + frozenset：
+# pydantic v2 把 Literal 编译成 C 级集合成员判断，比 Enum 的构造/比较快，
+# 且序列化时就是原生 str，无需取 .value。
+Species = Literal[
+    "bird",
+    "cat",
+    "dog",
+    "ferret",
+    "guinea_pig",
+    "hamster",
+    "rabbit",
+    "unknown",
+]
+
+VALID_SPECIES = frozenset(get_args(Species))
+
+
+@functools.cache
+def species_str(species) -> str:
+    """统一的 species -> str 转换：None 兜底 'unknown'。
+
+    各节点 Prompt / 检索 Filter / 缓存 key 都依赖这个稳定字符串，
+    集中在这里避免各处自己写兜底逻辑 (也兼容旧 checkpoint 里的 Enum 值)。
+    """
+    value = getattr(species, "value", species)
+    return str(value) if value else "unknown"
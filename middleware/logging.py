@@ -6,10 +6,16 @@ from langgraph.runtime import Runtime
 logger = logging.getLogger(__name__)
 
 class LoggingMiddleware(AgentMiddleware):
+    # 热路径：%-style 懒格式化，logger 级别过滤掉时不付格式化成本；
+    # 整条消息对象的 repr 很大，只在 DEBUG 才 dump
     def before_model(self, state: AgentState, runtime: Runtime) -> Dict[str, Any] | None:
-        logger.info(f"\nbefore_model: Sending {len(state['messages'])} messages to the model. last user message {state['messages'][-1]}\n")
+        logger.info("before_model: Sending %d messages to the model", len(state['messages']))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("before_model: last user message %s", state['messages'][-1])
         return None
-    
+
     def after_model(self, state: AgentState, runtime: Runtime) -> Dict[str, Any] | None:
-        logger.info(f"\nafter_model: Model responded: {state['messages'][-1]}\n")
+        logger.info("after_model: Model responded")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("after_model: %s", state['messages'][-1])
         return None
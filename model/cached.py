@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from model.orchestrator import orchestrator_model
+
+logger = logging.getLogger(__name__)
+
+
+class CachedChatModel:
+    """LLM 响应缓存包装器 (exact-match)。
+
+    Actor / Critic / QueryGen 都是 temperature=0 + 纯 SystemMessage 构造的
+    确定性调用：相同 Profile 在重试 / 回放场景下会产生逐字节相同的 Prompt。
+    用 blake2b(schema 名 + 消息内容) 做 key，命中时直接返回上次的响应对象，
+    把秒级的 LLM RTT 变成微秒级的字典查找。
+
+    进程内 LRU + TTL，模式与 common.semantic_cache 一致；所有
+    with_structured_output 分支共享同一份存储 (key 已含 schema 名)。
+    """
+
+    def __init__(self, model, schema_name: str = "", *,
+                 max_entries: int = 1024, ttl: float = 600.0, _store=None):
+        self._model = model
+        self._schema_name = schema_name
+        self._max_entries = max_entries
+        self._ttl = ttl
+        if _store is None:
+            self._entries: OrderedDict = OrderedDict()
+            self._lock = threading.Lock()
+        else:
+            # 结构化输出分支与父包装器共享同一份缓存
+            self._entries, self._lock = _store
+
+    def with_structured_output(self, schema, **kwargs):
+        bound = self._model.with_structured_output(schema, **kwargs)
+        return CachedChatModel(
+            bound,
+            schema_name=getattr(schema, "__name__", str(schema)),
+            max_entries=self._max_entries,
+            ttl=self._ttl,
+            _store=(self._entries, self._lock),
+        )
+
+    def _cache_key(self, messages) -> str:
+        h = hashlib.blake2b(self._schema_name.encode("utf-8"))
+        for msg in messages:
+            h.update(b"\x00")
+            h.update(str(msg.content).encode("utf-8"))
+        return h.hexdigest()
+
+    def invoke(self, messages, **kwargs):
+        key = self._cache_key(messages)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, ts = entry
+                if now - ts <= self._ttl:
+                    self._entries.move_to_end(key)
+                    logger.info(f"LLM cache hit ({self._schema_name or 'raw'})")
+                    return value
+                del self._entries[key]
+
+        response = self._model.invoke(messages, **kwargs)
+
+        with self._lock:
+            self._entries[key] = (response, now)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+
+# 确定性 (temp=0) 调用方共用的缓存实例
+cached_orchestrator_model = CachedChatModel(orchestrator_model)
@@ -1,8 +1,13 @@
 import os
 from langchain_deepseek import ChatDeepSeek
 
+# Extractor 的结构化 Schema 较重，最吃 TTFT，支持单独设置档位
+# (EXTRACTOR_SERVICE_TIER 优先，否则跟随全局 LLM_SERVICE_TIER)
+_SERVICE_TIER = os.getenv("EXTRACTOR_SERVICE_TIER", os.getenv("LLM_SERVICE_TIER"))
+
 extractor_model = ChatDeepSeek(
-    model="deepseek-chat", 
+    model="deepseek-chat",
     api_key=os.getenv("DEEPSEEK_API_KEY"),
-    temperature=0
+    temperature=0,
+    extra_body={"service_tier": _SERVICE_TIER} if _SERVICE_TIER else None,
 )
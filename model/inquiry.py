@@ -1,8 +1,12 @@
 import os
 from langchain_deepseek import ChatDeepSeek
 
+# 档位跟随全局 LLM_SERVICE_TIER，见 model/orchestrator.py
+_SERVICE_TIER = os.getenv("LLM_SERVICE_TIER")
+
 inquiry_model = ChatDeepSeek(
-    model="deepseek-chat", 
+    model="deepseek-chat",
     api_key=os.getenv("DEEPSEEK_API_KEY"),
-    temperature=0
-)
\ No newline at end of file
+    temperature=0,
+    extra_body={"service_tier": _SERVICE_TIER} if _SERVICE_TIER else None,
+)
@@ -1,8 +1,13 @@
 import os
 from langchain_deepseek import ChatDeepSeek
 
+# 延迟优化档位：DeepSeek 走 OpenAI 兼容协议，部分网关/供应商支持
+# service_tier (如 "priority") 换更低的 TTFT。不设环境变量则不下发该字段。
+_SERVICE_TIER = os.getenv("LLM_SERVICE_TIER")
+
 orchestrator_model = ChatDeepSeek(
-    model="deepseek-chat", 
+    model="deepseek-chat",
     api_key=os.getenv("DEEPSEEK_API_KEY"),
-    temperature=0
-)
\ No newline at end of file
+    temperature=0,
+    extra_body={"service_tier": _SERVICE_TIER} if _SERVICE_TIER else None,
+)
@@ -1,17 +1,40 @@
-import json
+import asyncio
 import os
 import logging
-import concurrent.futures
-from typing import Dict, List, Any
-from collections import defaultdict
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import ijson
+import numpy as np
 
 from rag.interface.base_evaluator import BaseEvaluator
 
 logger = logging.getLogger(__name__)
 
 class Evaluator(BaseEvaluator):
+    # 检索结果 LRU 上限：重复评测同一测试集时，命中项直接跳过 Qdrant
+    _SEARCH_CACHE_MAX = 10_000
+
     def __init__(self, retriever_instance):
         self.retriever = retriever_instance
+        # key: (query, species, top_k) -> List[SearchResult]
+        # Retriever.search 是确定性的，集合重建后应新建 Evaluator 使缓存失效
+        self._search_cache: OrderedDict = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+
+    def _cache_get(self, key: Tuple) -> Optional[List[Any]]:
+        with self._search_cache_lock:
+            results = self._search_cache.get(key)
+            if results is not None:
+                self._search_cache.move_to_end(key)
+            return results
+
+    def _cache_put(self, key: Tuple, results: List[Any]) -> None:
+        with self._search_cache_lock:
+            self._search_cache[key] = results
+            while len(self._search_cache) > self._SEARCH_CACHE_MAX:
+                self._search_cache.popitem(last=False)
 
     def _evaluate_single_case(self, case: Dict[str, Any], top_k: int, with_species_filter: bool) -> Dict[str, Any]:
         """
@@ -21,14 +44,20 @@ class Evaluator(BaseEvaluator):
         target_id = case.get("id")
         difficulty = case.get("difficulty", "Unknown") # 获取难度标签
         
-        # 1. 执行检索
+        # 1. 执行检索 (先查 LRU，未命中才打 Qdrant)
+        species = case.get("species") if with_species_filter else None
+        cache_key = (query, species, top_k)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return self._score_case(case, cached)
+
         try:
             if with_species_filter:
-                species = case.get("species")
                 # 注意：确保你的 retriever.search 方法支持 species_filter 参数
                 results = self.retriever.search(query=query, filters={"species": species}, limit=top_k)
             else:
                 results = self.retriever.search(query=query, limit=top_k)
+            self._cache_put(cache_key, results)
         except Exception as e:
             logger.error(f"Error searching for query ID {target_id}: {e}")
             return {
@@ -38,27 +67,84 @@ class Evaluator(BaseEvaluator):
                 "error": True
             }
 
-        # 2. 计算指标
-        retrieved_ids = [res.id for res in results]
-        
-        is_hit = target_id in retrieved_ids
-        mrr_val = 0.0
-        
-        if is_hit:
-            rank = retrieved_ids.index(target_id) + 1
-            mrr_val = 1.0 / rank
+        return self._score_case(case, results)
+
+    @staticmethod
+    def _score_case(case: Dict[str, Any], results: List[Any]) -> Dict[str, Any]:
+        """根据检索结果算单 case 指标 (id -> 名次 dict，O(1) 查找)"""
+        rank_map = {res.id: i for i, res in enumerate(results)}
+
+        rank = rank_map.get(case.get("id"))
+        is_hit = rank is not None
+        mrr_val = 1.0 / (rank + 1) if is_hit else 0.0
 
         return {
-            "difficulty": difficulty,
+            "difficulty": case.get("difficulty", "Unknown"),
             "hit": is_hit,
             "mrr": mrr_val,
             "error": False
         }
 
-    def evaluate(self, test_file: str, top_k: int = 10, with_species_filter: bool = True, max_workers: int = 20) -> Dict[str, Dict[str, float]]:
+    def _evaluate_case_batch(self, cases: List[Dict[str, Any]], top_k: int, with_species_filter: bool) -> List[Dict[str, Any]]:
+        """
+        一个 chunk 的 case 打包成一次 query_batch_points 往返：
+        N 次 HTTP RTT -> N/chunk 次，服务端并行扇出
+        """
+        # 先过一遍 LRU，只有未命中的 case 进批量请求
+        results_by_idx: Dict[int, List[Any]] = {}
+        miss_indices: List[int] = []
+        cache_keys = []
+        for i, c in enumerate(cases):
+            species = c.get("species") if with_species_filter else None
+            key = (c.get("query", ""), species, top_k)
+            cache_keys.append(key)
+            cached = self._cache_get(key)
+            if cached is not None:
+                results_by_idx[i] = cached
+            else:
+                miss_indices.append(i)
+
+        if miss_indices:
+            queries = [cases[i].get("query", "") for i in miss_indices]
+            if with_species_filter:
+                per_query_filters = [
+                    {"species": cases[i].get("species")} for i in miss_indices
+                ]
+            else:
+                per_query_filters = [None] * len(miss_indices)
+
+            try:
+                results_lists = self.retriever.search_batch(
+                    queries, limit=top_k, per_query_filters=per_query_filters
+                )
+            except Exception as e:
+                logger.error(f"Error batch-searching {len(miss_indices)} cases: {e}")
+                return [
+                    self._score_case(case, results_by_idx[i])
+                    if i in results_by_idx
+                    else {
+                        "difficulty": case.get("difficulty", "Unknown"),
+                        "hit": False,
+                        "mrr": 0.0,
+                        "error": True
+                    }
+                    for i, case in enumerate(cases)
+                ]
+
+            for i, results in zip(miss_indices, results_lists):
+                self._cache_put(cache_keys[i], results)
+                results_by_idx[i] = results
+
+        return [
+            self._score_case(case, results_by_idx[i])
+            for i, case in enumerate(cases)
+        ]
+
+    def evaluate(self, test_file: str, top_k: int = 10, with_species_filter: bool = True, max_workers: int = 20, batch_size: int = 64) -> Dict[str, Dict[str, float]]:
         """
         并行执行评测，并按难度分层统计指标
         :param max_workers: 并发线程数
+        :param batch_size: 每次 query_batch_points 打包的 case 数
         """
         logger.info(f"Starting evaluation using {test_file} @ Top-{top_k} | Filter={with_species_filter} | Workers={max_workers}...")
         
@@ -66,54 +152,91 @@ class Evaluator(BaseEvaluator):
             logger.error(f"Test file {test_file} not found.")
             return {}
 
-        with open(test_file, 'r', encoding='utf-8') as f:
-            test_cases = json.load(f)
+        # 初始化统计容器 (SoA): 每个难度分配一个整数 code，三个预分配数组
+        # 按 code 原地累加，热路径上没有 dict/临时对象；汇总时向量化求比率。
+        # code 0 固定是 Total，新难度标签按出现顺序追加，数组按需翻倍扩容。
+        cat_codes: Dict[str, int] = {"Total": 0, "Easy": 1, "Medium": 2, "Hard": 3}
+        capacity = 16
+        hits = np.zeros(capacity, np.int64)
+        mrr_sums = np.zeros(capacity, np.float64)
+        counts = np.zeros(capacity, np.int64)
+        processed_count = 0
 
-        total_cases = len(test_cases)
-        
-        # 初始化统计容器
-        # 结构: stats[category] = {'hits': 0, 'mrr_sum': 0.0, 'count': 0}
-        # Categories 包括: 'Total', 'Easy', 'Medium', 'Hard', etc.
-        stats = defaultdict(lambda: {'hits': 0, 'mrr_sum': 0.0, 'count': 0})
-
-        # --- 并行执行 ---
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交任务
-            future_to_case = {
-                executor.submit(self._evaluate_single_case, case, top_k, with_species_filter): case 
-                for case in test_cases
-            }
-            
-            processed_count = 0
-            
-            # 处理结果 (as_completed 会在任务完成时立刻返回)
-            for future in concurrent.futures.as_completed(future_to_case):
-                processed_count += 1
-                result = future.result()
-                
-                if result.get("error"):
-                    continue
-
-                difficulty = result["difficulty"]
-                hit = result["hit"]
-                mrr = result["mrr"]
-
-                # 1. 更新总榜 (Total)
-                stats["Total"]["count"] += 1
-                if hit:
-                    stats["Total"]["hits"] += 1
-                    stats["Total"]["mrr_sum"] += mrr
-
-                # 2. 更新分榜 (Difficulty)
-                stats[difficulty]["count"] += 1
-                if hit:
-                    stats[difficulty]["hits"] += 1
-                    stats[difficulty]["mrr_sum"] += mrr
-
-                # 进度日志 (每完成 10% 或 20条 打印一次)
-                if processed_count % max_workers == 0 or processed_count == total_cases:
-                    current_acc = stats["Total"]["hits"] / stats["Total"]["count"] if stats["Total"]["count"] else 0
-                    logger.info(f"Progress: {processed_count}/{total_cases} | Current Total Hit Rate: {current_acc:.2%}")
+        def _record(result: Dict[str, Any]) -> None:
+            nonlocal processed_count, capacity, hits, mrr_sums, counts
+            processed_count += 1
+
+            if result.get("error"):
+                return
+
+            code = cat_codes.setdefault(result["difficulty"], len(cat_codes))
+            if code >= capacity:
+                # 注意不能用 np.resize：它用旧数据循环填充新增区间，
+                # 新难度的计数会叠在别的类目上；补零拼接才是真扩容
+                grow = capacity
+                capacity *= 2
+                hits = np.concatenate([hits, np.zeros(grow, hits.dtype)])
+                mrr_sums = np.concatenate([mrr_sums, np.zeros(grow, mrr_sums.dtype)])
+                counts = np.concatenate([counts, np.zeros(grow, counts.dtype)])
+
+            hit = result["hit"]
+            mrr = result["mrr"]
+
+            # Total (code 0) + 难度分榜
+            counts[0] += 1
+            counts[code] += 1
+            if hit:
+                hits[0] += 1
+                hits[code] += 1
+                mrr_sums[0] += mrr
+                mrr_sums[code] += mrr
+
+            # 进度日志
+            if processed_count % max_workers == 0:
+                current_acc = hits[0] / counts[0] if counts[0] else 0
+                logger.info(f"Progress: {processed_count} cases | Current Total Hit Rate: {current_acc:.2%}")
+
+        # --- 流式解析 + 异步并发执行 ---
+        # 事件循环 + Semaphore 做背压：检索是对 Qdrant 的 I/O (embed/rerank
+        # 在线程里跑)，在途任务数上限 max_workers * 4，吞吐上限交给 Qdrant 侧。
+        # ijson 边解析边提交，worker 不用等整个文件 load 完就开始跑。
+        max_inflight = max_workers * 4
+
+        async def _run() -> None:
+            loop = asyncio.get_running_loop()
+            # to_thread 走默认 executor，显式放大线程数以免其默认上限卡住并发
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=max_inflight))
+            sem = asyncio.Semaphore(max_inflight)
+
+            async def _worker(chunk: List[Dict[str, Any]]) -> None:
+                try:
+                    batch_results = await asyncio.to_thread(
+                        self._evaluate_case_batch, chunk, top_k, with_species_filter
+                    )
+                    for result in batch_results:
+                        _record(result)
+                finally:
+                    sem.release()
+
+            tasks = []
+            chunk: List[Dict[str, Any]] = []
+            with open(test_file, 'rb') as f:
+                for case in ijson.items(f, 'item'):
+                    chunk.append(case)
+                    if len(chunk) >= batch_size:
+                        await sem.acquire()
+                        tasks.append(asyncio.create_task(_worker(chunk)))
+                        chunk = []
+                if chunk:
+                    await sem.acquire()
+                    tasks.append(asyncio.create_task(_worker(chunk)))
+
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        asyncio.run(_run())
+
+        logger.info(f"Progress: {processed_count} cases processed in total.")
 
         # --- 汇总与输出 ---
         logger.info("\n" + "=" * 60)
@@ -122,26 +245,21 @@ class Evaluator(BaseEvaluator):
 
         final_metrics = {}
 
-        # 确保输出顺序：Total -> Easy -> Medium -> Hard -> Others
-        categories = ["Total", "Easy", "Medium", "Hard"]
-        #如果有其他未知的难度标签，也加进来
-        existing_keys = list(stats.keys())
-        for k in existing_keys:
-            if k not in categories:
-                categories.append(k)
+        # 向量化求比率 (count=0 的槽位置 0，后面会跳过)
+        n_cats = len(cat_codes)
+        safe_counts = np.maximum(counts[:n_cats], 1)
+        hit_rates = hits[:n_cats] / safe_counts
+        avg_mrrs = mrr_sums[:n_cats] / safe_counts
 
-        for cat in categories:
-            if cat not in stats:
-                continue
-            
-            data = stats[cat]
-            count = data["count"]
+        # 输出顺序：Total -> Easy -> Medium -> Hard -> Others (cat_codes 本身有序)
+        for cat, code in cat_codes.items():
+            count = int(counts[code])
             if count == 0:
                 continue
-                
-            hit_rate = data["hits"] / count
-            avg_mrr = data["mrr_sum"] / count
-            
+
+            hit_rate = float(hit_rates[code])
+            avg_mrr = float(avg_mrrs[code])
+
             # 存入返回结果
             final_metrics[cat] = {
                 "hit_rate": round(hit_rate, 4),
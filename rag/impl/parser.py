@@ -1,21 +1,15 @@
+import asyncio
 import os
 import json
 import logging
+import random
+import orjson
 import pandas as pd
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from rag.interface.base_parser import BaseParser
-from rag.schema.pet_record import PetRecord
-
-# Retry logic
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_random_exponential,
-    retry_if_exception_type
-)
+from rag.schema.pet_record import PetRecord, PET_RECORD_LIST_ADAPTER
 
 # LangChain Imports
 from langchain_deepseek import ChatDeepSeek
@@ -25,39 +19,10 @@ from langchain_core.exceptions import OutputParserException
 
 logger = logging.getLogger(__name__)
 
-class Parser(BaseParser):
-    def __init__(
-        self,
-        model_name: str = "deepseek-chat",
-        temperature: float = 0,
-        batch_size: int = 20, # 保持较小的 batch size 以保证精度
-        max_workers: int = 20,
-    ):
-        """
-        初始化解析器，使用 LangChain 组件，支持并发和重试
-        """
-        api_key = os.getenv("DEEPSEEK_API_KEY")
-        if not api_key:
-            raise ValueError("Environment variable DEEPSEEK_API_KEY not found.")
-
-        # 1. 初始化 LLM
-        self.llm = ChatDeepSeek(
-            model=model_name,
-            api_key=api_key, # Langchain DeepSeek 使用 api_key 参数
-            temperature=temperature,
-            # 强制 JSON 模式
-            model_kwargs={"response_format": {"type": "json_object"}},
-        )
-
-        self.batch_size = batch_size
-        self.max_workers = max_workers
-        self.chain = self._build_chain()
-
-    def _build_chain(self):
-        """
-        构建 LCEL 处理链
-        """
-        system_template = """
+# System 模板是纯常量 (不含 {batch_size} 等插值)：DeepSeek 的前缀缓存按字节
+# 匹配，20 个并发 worker 发出的请求共享同一个 system 前缀，服务端几乎全命中。
+# 批次条数的提示挪到了 human 消息里。
+_SYSTEM_TEMPLATE = """
         You are a veterinary data structuring expert.
         Your task is to extract structured information from the provided user observations.
 
@@ -92,12 +57,50 @@ class Parser(BaseParser):
         Input: "My pet is not eating."
         Output: {{"id": 3, "species": "unknown", "specific_breed": "unknown", "symptom_keywords": ["anorexia"]}}
 
-        Do not miss any records. If {batch_size} records are input, {batch_size} records must be output.
+        Do not miss any records. The human message states how many records are input; exactly that many records must be output.
         """
-        human_template = "Input Data (JSON):\n{batch_data}"
 
+_HUMAN_TEMPLATE = "Input Data (JSON, {batch_size} records):\n{batch_data}"
+
+
+class Parser(BaseParser):
+    def __init__(
+        self,
+        model_name: str = "deepseek-chat",
+        temperature: float = 0,
+        batch_size: int = 20, # 保持较小的 batch size 以保证精度
+        max_workers: int = 20,
+        target_batch_chars: int = 12_000,
+    ):
+        """
+        初始化解析器，使用 LangChain 组件，支持并发和重试
+        """
+        api_key = os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise ValueError("Environment variable DEEPSEEK_API_KEY not found.")
+
+        # 1. 初始化 LLM
+        self.llm = ChatDeepSeek(
+            model=model_name,
+            api_key=api_key, # Langchain DeepSeek 使用 api_key 参数
+            temperature=temperature,
+            # 强制 JSON 模式
+            model_kwargs={"response_format": {"type": "json_object"}},
+        )
+
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        # 动态打包的字符预算 (约 3k tokens)：短观察多塞几条、长观察少塞，
+        # 避免固定条数下长文本批次截断后整批重试
+        self.target_batch_chars = target_batch_chars
+        self.chain = self._build_chain()
+
+    def _build_chain(self):
+        """
+        构建 LCEL 处理链
+        """
         prompt = ChatPromptTemplate.from_messages(
-            [("system", system_template), ("user", human_template)]
+            [("system", _SYSTEM_TEMPLATE), ("user", _HUMAN_TEMPLATE)]
         )
 
         parser = JsonOutputParser()
@@ -105,60 +108,102 @@ class Parser(BaseParser):
         # 构建链：Prompt -> LLM -> JSON Parser
         return prompt | self.llm | parser
 
-    # --- 核心升级：增加重试装饰器 ---
-    @retry(
-        stop=stop_after_attempt(3), # 最多重试3次
-        wait=wait_random_exponential(min=1, max=10), # 指数退避
-        reraise=True
-    )
-    def _process_batch(self, batch: List[Dict]) -> List[Dict]:
+    _MAX_ATTEMPTS = 3
+
+    async def _process_batch(self, batch: List[Dict]) -> List[Dict]:
         """
-        处理单个批次，带有重试机制
+        处理单个批次：内联指数退避重试 (比 tenacity wrapper 少一层逐调用开销)。
+        连续失败两次后把批次二分递归处理——通常只有个别记录导致漏条，
+        分治能把坏记录隔离到小子批，而不是让整批重试三轮全部作废。
         """
-        try:
-            if len(batch) == 0:
-                return []
-
-            batch_ids = [item['id'] for item in batch]
-            
-            # 将 batch 转换为 json string
-            batch_json_str = json.dumps(batch, ensure_ascii=False)
-
-            # 调用链，传入 batch_size 用于 prompt 提示
-            response = self.chain.invoke({
-                "batch_data": batch_json_str,
-                "batch_size": len(batch)
-            })
-
-            results = response.get("results", [])
-
-            # 【关键校验】输入输出数量必须一致，否则视为失败，触发重试
-            if len(results) != len(batch):
-                logger.warning(f"Batch size mismatch! Input: {len(batch)}, Output: {len(results)}. Retrying...")
-                raise ValueError("Output count mismatch")
-            
-            validated_results = []
-            input_map = {item['id']: item['text'] for item in batch}
-            for item in results:
-                original_text = input_map.get(item['id'])
-                record_data = {
-                    "id": item['id'],
-                    "text": original_text,
-                    "species": item.get("species"),
-                    "specific_breed": item.get("specific_breed"),
-                    "symptom_keywords": item.get("symptom_keywords")
-                }
-                # data validation
-                record = PetRecord(**record_data)
-                validated_results.append(record.model_dump())
-            if len(validated_results) != len(batch):
-                logger.warning(f"Batch size mismatch! Input: {len(batch)}, Validated: {len(validated_results)}. Retrying...")
-                raise ValueError("Validation count mismatch")
-            return results
-
-        except Exception as e:
-            logger.error(f"Error processing batch {batch_ids[0]} - {batch_ids[-1]}: {e}")
-            raise e # 抛出异常以触发 tenacity 重试
+        if len(batch) == 0:
+            return []
+
+        batch_ids = [item['id'] for item in batch]
+        last_exc: Exception = RuntimeError("unreachable")
+
+        for attempt in range(self._MAX_ATTEMPTS):
+            if attempt:
+                # 随机指数退避
+                await asyncio.sleep(random.random() * (2 ** attempt))
+            try:
+                return await self._invoke_batch(batch)
+            except Exception as e:
+                last_exc = e
+                logger.error(
+                    f"Error processing batch {batch_ids[0]} - {batch_ids[-1]} "
+                    f"(attempt {attempt + 1}/{self._MAX_ATTEMPTS}): {e}"
+                )
+                if attempt == 1 and len(batch) > 1:
+                    # 二分分治，子批各自带完整的重试预算
+                    mid = len(batch) // 2
+                    left, right = await asyncio.gather(
+                        self._process_batch(batch[:mid]),
+                        self._process_batch(batch[mid:]),
+                    )
+                    return left + right
+
+        raise last_exc
+
+    async def _invoke_batch(self, batch: List[Dict]) -> List[Dict]:
+        """
+        单次 LLM 调用 + 校验，失败抛异常交给 _process_batch 重试
+        """
+        # 将 batch 转换为 json string
+        batch_json_str = json.dumps(batch, ensure_ascii=False)
+
+        # 调用链，传入 batch_size 用于 prompt 提示
+        response = await self.chain.ainvoke({
+            "batch_data": batch_json_str,
+            "batch_size": len(batch)
+        })
+
+        results = response.get("results", [])
+
+        # 【关键校验】输入输出数量必须一致，否则视为失败，触发重试
+        if len(results) != len(batch):
+            logger.warning(f"Batch size mismatch! Input: {len(batch)}, Output: {len(results)}. Retrying...")
+            raise ValueError("Output count mismatch")
+
+        input_map = {item['id']: item['text'] for item in batch}
+        records_data = [
+            {
+                "id": item['id'],
+                "text": input_map.get(item['id']),
+                "species": item.get("species"),
+                "specific_breed": item.get("specific_breed"),
+                "symptom_keywords": item.get("symptom_keywords")
+            }
+            for item in results
+        ]
+        # data validation: 复用预编译 adapter，一次调用校验整批
+        validated_results = PET_RECORD_LIST_ADAPTER.validate_python(records_data)
+        if len(validated_results) != len(batch):
+            logger.warning(f"Batch size mismatch! Input: {len(batch)}, Validated: {len(validated_results)}. Retrying...")
+            raise ValueError("Validation count mismatch")
+        return results
+
+    def _pack_batches(self, records: List[Dict]) -> List[List[Dict]]:
+        """
+        按累计字符数贪心打包：达到 target_batch_chars 即 flush。
+        条数上限取 batch_size * 2，限制单批条数以免 LLM 漏条后整批重试的代价过大。
+        """
+        max_records = self.batch_size * 2
+        batches: List[List[Dict]] = []
+        current: List[Dict] = []
+        current_chars = 0
+
+        for record in records:
+            current.append(record)
+            current_chars += len(record.get("text") or "")
+            if current_chars >= self.target_batch_chars or len(current) >= max_records:
+                batches.append(current)
+                current = []
+                current_chars = 0
+
+        if current:
+            batches.append(current)
+        return batches
 
     def load_raw_data(self, input_path: str) -> pd.DataFrame:
         """
@@ -167,14 +212,21 @@ class Parser(BaseParser):
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input file not found: {input_path}")
 
-        df = pd.read_csv(input_path)
-
         required_cols = ["text", "condition", "record_type"]
-        if not all(col in df.columns for col in required_cols):
-            raise ValueError(f"CSV missing required columns: {required_cols}")
-        
-        # 1. 过滤 Owner Observation
-        df_owner = df[df['record_type'].str.strip() == 'Owner Observation'].copy()
+        # pyarrow 引擎：多线程 C 解析 + arrow 字符串列，比默认引擎快数倍且省内存；
+        # usecols 在解析阶段就跳过不需要的列
+        try:
+            df = pd.read_csv(
+                input_path,
+                engine="pyarrow",
+                dtype_backend="pyarrow",
+                usecols=required_cols,
+            )
+        except ValueError as e:
+            raise ValueError(f"CSV missing required columns: {required_cols}") from e
+
+        # 1. 过滤 Owner Observation (arrow 字符串列上的向量化 strip/比较)
+        df_owner = df[df['record_type'].str.strip().eq('Owner Observation')].copy()
         
         # 2. 生成唯一 ID (锚点)
         if "id" not in df_owner.columns:
@@ -198,45 +250,59 @@ class Parser(BaseParser):
         # 只取需要的字段发送给 LLM
         records = df[["id", "text"]].to_dict(orient="records")
         
-        # 切分 Batches
-        batches = [records[i : i + self.batch_size] for i in range(0, len(records), self.batch_size)]
+        # 切分 Batches (贪心打包：按累计字符数凑批，条数上限兜底)
+        batches = self._pack_batches(records)
         total_batches = len(batches)
         
         logger.info(f"Processing {len(records)} records in {total_batches} batches with {self.max_workers} threads...")
 
-        all_results = []
-        
-        # 2. Extract (Parallel Processing)
-        # 使用 ThreadPoolExecutor 进行并发请求
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交任务
-            future_to_batch = {executor.submit(self._process_batch, batch): batch for batch in batches}
-            
+        # id -> 提取结果的哈希表，在收集结果的循环里顺手构建 (零额外遍历)，
+        # 替代 pd.merge 的排序合并和两份中间 DataFrame
+        extracted_map: Dict[int, Dict] = {}
+
+        # 2. Extract (Async Parallel Processing)
+        # 事件循环 + Semaphore 控并发：等待 API 响应不占线程，
+        # 同样的内存/CPU 预算能挂起远多于线程池的在途请求
+        async def _run_all() -> None:
+            sem = asyncio.Semaphore(self.max_workers)
+
+            async def _worker(batch: List[Dict]) -> List[Dict]:
+                async with sem:
+                    return await self._process_batch(batch)
+
+            tasks = [asyncio.create_task(_worker(batch)) for batch in batches]
+
             # 使用 tqdm 监控进度
-            for future in tqdm(as_completed(future_to_batch), total=total_batches, desc="Parallel Extraction"):
+            for future in tqdm(asyncio.as_completed(tasks), total=total_batches, desc="Parallel Extraction"):
                 try:
-                    batch_result = future.result()
-                    all_results.extend(batch_result)
+                    for item in await future:
+                        extracted_map[int(item["id"])] = item
                 except Exception as e:
                     # 如果重试多次后依然失败，记录错误但不中断整个流程 (或者根据需求抛出异常)
                     logger.critical(f"A batch failed after retries: {e}")
                     # 在生产环境中，这里应该把失败的 batch ID 写入 fail_log
 
-        # 3. Merge & Format
-        if not all_results:
-            raise RuntimeError("Extraction failed. No data returned from LLM.")
+        asyncio.run(_run_all())
 
-        extracted_df = pd.DataFrame(all_results)
-        
-        # 确保 ID 类型一致
-        extracted_df["id"] = extracted_df["id"].astype(int)
-
-        # 合并原始数据 (Inner Join 确保只有成功提取的数据才被保留)
-        final_df = pd.merge(df, extracted_df, on="id", how="inner", validate="one_to_one")
+        # 3. Merge & Format (哈希 Join；只保留成功提取的记录，等价 Inner Join)
+        if not extracted_map:
+            raise RuntimeError("Extraction failed. No data returned from LLM.")
 
-        # 4. Save as JSON
+        final_records = []
+        for row in df.itertuples(index=False):
+            record = row._asdict()
+            extracted = extracted_map.get(int(record["id"]))
+            if extracted is None:
+                continue
+            for key, value in extracted.items():
+                if key != "id":
+                    record[key] = value
+            final_records.append(record)
+
+        # 4. Save as JSON (orjson 原生输出 UTF-8 字节，比标准库快数倍)
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        final_df.to_json(output_path, orient="records", indent=2, force_ascii=False)
+        with open(output_path, "wb") as f:
+            f.write(orjson.dumps(final_records, option=orjson.OPT_INDENT_2))
 
-        logger.info(f"--- [Parser] Success! Processed {len(final_df)} records. Data saved to {output_path} ---")
+        logger.info(f"--- [Parser] Success! Processed {len(final_records)} records. Data saved to {output_path} ---")
         return output_path
@@ -1,10 +1,15 @@
-import json
+import asyncio
 import os
 import random
+import re
 import logging
-import concurrent.futures  # <--- 新增引入
+import time
+from collections import deque
 from typing import List, Dict, Any, Optional
 
+import httpx
+import openai
+import orjson
 from langchain_deepseek import ChatDeepSeek
 from langchain_core.messages import SystemMessage, HumanMessage
 
@@ -12,22 +17,104 @@ from rag.interface.base_query_generator import BaseQueryGenerator
 
 logger = logging.getLogger(__name__)
 
+# 解析失败时从杂音里捞出最外层 JSON 对象用的兜底正则
+_JSON_RE = re.compile(r"\{.*\}", re.S)
+
+# 跨实例共享的 HTTP 客户端与模型单例：
+# 连接池 (TCP+TLS keepalive) 挂在进程级 AsyncClient 上，重复构造
+# QueryGenerator 不会再触发每连接 ~100ms 的 TLS 握手
+_shared_http_client: Optional[httpx.AsyncClient] = None
+_llm_cache: Dict[tuple, ChatDeepSeek] = {}
+
+
+def _get_llm(api_key: str, model_name: str) -> ChatDeepSeek:
+    global _shared_http_client
+    if _shared_http_client is None:
+        _shared_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+            timeout=httpx.Timeout(120.0),
+        )
+
+    key = (api_key, model_name)
+    llm = _llm_cache.get(key)
+    if llm is None:
+        llm = ChatDeepSeek(
+            api_key=api_key,
+            model=model_name,
+            temperature=0.7,
+            model_kwargs={"response_format": {"type": "json_object"}},
+            http_async_client=_shared_http_client,
+        )
+        _llm_cache[key] = llm
+    return llm
+
+
+class _AsyncRateLimiter:
+    """简易令牌桶：同时限制 RPM 和 TPM，顶着 Provider 限额跑但不过线。
+
+    请求时间戳和 token 用量各自记在 60s 滑动窗口里，超额时挂起等窗口滑出，
+    不丢请求。TPM 用实际 response.usage 回填，请求前先按预估值占位。
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._req_times: deque = deque()
+        self._token_log: deque = deque()  # (timestamp, tokens)
+        self._lock = asyncio.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self._req_times and now - self._req_times[0] > 60:
+            self._req_times.popleft()
+        while self._token_log and now - self._token_log[0][0] > 60:
+            self._token_log.popleft()
+
+    async def acquire(self, projected_tokens: int) -> None:
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._evict(now)
+                window_tokens = sum(t for _, t in self._token_log)
+                if (len(self._req_times) < self.rpm
+                        and window_tokens + projected_tokens <= self.tpm):
+                    self._req_times.append(now)
+                    return
+                # 等最老的记录滑出窗口
+                oldest = min(
+                    [self._req_times[0]] if self._req_times else [now],
+                    default=now,
+                )
+                if self._token_log:
+                    oldest = min(oldest, self._token_log[0][0])
+                wait = max(60 - (now - oldest), 0.1)
+            await asyncio.sleep(wait)
+
+    def record_usage(self, tokens: int) -> None:
+        self._token_log.append((time.monotonic(), tokens))
+
+
 class QueryGenerator(BaseQueryGenerator):
+
+    # 重试次数 / TPM 预估占位 (生成 3 条 query 的 Prompt+回复量级)
+    _MAX_ATTEMPTS = 3
+    _EST_TOKENS_PER_CALL = 1500
+
     def __init__(self, api_key: Optional[str] = None, model_name: str = "deepseek-chat"):
         # 1. 获取 API Key
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         if not self.api_key:
             raise ValueError("DeepSeek API Key is missing. Set DEEPSEEK_API_KEY env var.")
         
-        # 2. 初始化 LangChain Chat Model
-        self.llm = ChatDeepSeek(
-            api_key=self.api_key,
-            model=model_name,
-            temperature=0.7,
-            model_kwargs={"response_format": {"type": "json_object"}} 
+        # 2. 获取共享的 LangChain Chat Model (连接池复用)
+        self.llm = _get_llm(self.api_key, model_name)
+
+        # 全局限流器：所有并发 worker 共享一个桶
+        self._limiter = _AsyncRateLimiter(
+            rpm=int(os.getenv("DEEPSEEK_RPM", "300")),
+            tpm=int(os.getenv("DEEPSEEK_TPM", "200000")),
         )
 
-    def _call_llm(self, record: Dict) -> List[Dict[str, str]]:
+    async def _call_llm(self, record: Dict) -> List[Dict[str, str]]:
         """
         私有方法：调用 DeepSeek 生成 3 个不同难度的 Query
         """
@@ -90,35 +177,57 @@ class QueryGenerator(BaseQueryGenerator):
             HumanMessage(content=prompt_content)
         ]
 
-        try:
-            # LangChain Invoke (这里是线程安全的)
-            response = self.llm.invoke(messages)
-            content = response.content
-            
-            # --- 鲁棒性清洗 ---
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(content)
-            
-            if isinstance(result, dict) and "queries" in result:
-                return result["queries"]
-            elif isinstance(result, list):
-                return result
-            else:
-                logger.warning(f"Unexpected JSON structure for ID {record.get('id')}")
-                return []
+        # 重试循环：429/连接抖动/坏 JSON 退避后重来，不直接丢掉这条记录
+        for attempt in range(self._MAX_ATTEMPTS):
+            await self._limiter.acquire(self._EST_TOKENS_PER_CALL)
+            try:
+                # 异步 HTTP：调用挂起时不占线程，靠事件循环复用连接
+                response = await self.llm.ainvoke(messages)
+
+                # 用实际 token 数回填 TPM 窗口，预估不准时自动校正
+                usage = getattr(response, "usage_metadata", None) or {}
+                self._limiter.record_usage(
+                    usage.get("total_tokens", self._EST_TOKENS_PER_CALL)
+                )
 
-        except Exception as e:
-            logger.error(f"LLM generation failed for ID {record.get('id')}: {e}")
-            return []
+                content = response.content
+
+                # response_format=json_object 保证正常返回就是裸 JSON，
+                # 直接解析；失败才用正则捞一次 (偶发 markdown 围栏)，
+                # 省掉每次调用的 split 字符串拷贝
+                try:
+                    result = orjson.loads(content)
+                except orjson.JSONDecodeError:
+                    match = _JSON_RE.search(content)
+                    if match is None:
+                        raise
+                    result = orjson.loads(match.group(0))
+
+                if isinstance(result, dict) and "queries" in result:
+                    return result["queries"]
+                elif isinstance(result, list):
+                    return result
+                else:
+                    logger.warning(f"Unexpected JSON structure for ID {record.get('id')}")
+                    return []
+
+            except (openai.RateLimitError, openai.APIConnectionError,
+                    orjson.JSONDecodeError) as e:
+                if attempt + 1 >= self._MAX_ATTEMPTS:
+                    logger.error(f"LLM generation failed for ID {record.get('id')} after {self._MAX_ATTEMPTS} attempts: {e}")
+                    return []
+                backoff = 2 ** attempt + random.random()
+                logger.warning(f"Transient error for ID {record.get('id')} (attempt {attempt + 1}): {e}. Retrying in {backoff:.1f}s...")
+                await asyncio.sleep(backoff)
+            except Exception as e:
+                logger.error(f"LLM generation failed for ID {record.get('id')}: {e}")
+                return []
+        return []
 
     def generate_test_set(self, source_file: str, sample_size: int = 50, output_file: str = "./rag/data/generated_test_set.json", max_workers: int = 20) -> None:
         """
         生成测试集（并行版）
-        :param max_workers: 并发线程数。建议设置为 5-10，取决于你的 API Rate Limit。
+        :param max_workers: 最大并发 LLM 调用数 (Semaphore 上限)，取决于你的 API Rate Limit。
         """
         logger.info(f"Loading source data from {source_file}...")
         
@@ -127,57 +236,104 @@ class QueryGenerator(BaseQueryGenerator):
             logger.error(f"Source file not found: {path}")
             return
 
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # orjson: C 实现的解析，MB 级源文件比标准库快数倍
+        with open(path, 'rb') as f:
+            data = orjson.loads(f.read())
 
         # 随机采样
         real_sample_size = min(len(data), sample_size)
         sampled_records = random.sample(data, real_sample_size)
-        
-        logger.info(f"Sampled {real_sample_size} records. Starting PARALLEL generation with {max_workers} workers...")
-        
-        eval_dataset = []
-        
+
+        # --- 断点续跑 ---
+        # 逐条结果追加写入 JSONL checkpoint：中途崩溃时已完成的 API 调用不作废，
+        # 重跑会跳过 checkpoint 里已有的 record id
+        checkpoint_file = output_file + ".jsonl"
+        done_ids = set()
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        done_ids.add(orjson.loads(line)["id"])
+            if done_ids:
+                logger.info(f"Resuming: {len(done_ids)} records already in {checkpoint_file}, skipping them.")
+                sampled_records = [r for r in sampled_records if r["id"] not in done_ids]
+
+        logger.info(f"Sampled {real_sample_size} records ({len(sampled_records)} to run). Starting ASYNC generation with {max_workers} in-flight calls...")
+
         # --- 并行执行核心逻辑 ---
-        # 使用 ThreadPoolExecutor 管理线程池
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 1. 提交任务：建立 Future 到 Record 的映射，以便后续追踪是谁的结果
-            future_to_record = {
-                executor.submit(self._call_llm, record): record 
-                for record in sampled_records
-            }
-            
-            # 2. 获取结果：as_completed 会在任务完成时立刻 yield，而不是按顺序等待
+        # 生产者-消费者：固定 max_workers 个 worker 从有界队列取活，
+        # 背压自动生效，内存里只有 O(max_workers) 个在途任务，
+        # 而不是一次性挂起 sample_size 个 Future
+        async def _run_all():
+            work_q: asyncio.Queue = asyncio.Queue(maxsize=max_workers * 2)
+            out_q: asyncio.Queue = asyncio.Queue()
             completed_count = 0
-            for future in concurrent.futures.as_completed(future_to_record):
-                record = future_to_record[future]
-                completed_count += 1
-                
-                try:
-                    queries = future.result() # 获取返回值，如果线程抛出异常这里会 raise
-                    
-                    # 将结果加入数据集
+
+            async def _producer():
+                for record in sampled_records:
+                    await work_q.put(record)
+                # 每个 worker 一个关停哨兵
+                for _ in range(max_workers):
+                    await work_q.put(None)
+
+            async def _worker():
+                while True:
+                    record = await work_q.get()
+                    if record is None:
+                        break
+                    try:
+                        queries = await self._call_llm(record)
+                    except Exception as e:
+                        logger.error(f"Worker exception for record ID {record.get('id')}: {e}")
+                        queries = []
+                    await out_q.put((record, queries))
+                await out_q.put(None)
+
+            producer = asyncio.create_task(_producer())
+            workers = [asyncio.create_task(_worker()) for _ in range(max_workers)]
+
+            # 消费端：谁先完成谁先落盘，慢请求不阻塞 checkpoint
+            finished_workers = 0
+            with open(checkpoint_file, 'ab') as ckpt:
+                while finished_workers < max_workers:
+                    item = await out_q.get()
+                    if item is None:
+                        finished_workers += 1
+                        continue
+                    record, queries = item
+                    completed_count += 1
+
                     for q in queries:
-                        eval_dataset.append({
+                        ckpt.write(orjson.dumps({
                             "id": record["id"],
                             "species": record.get("species"),
                             "original_text": record.get("text"),
                             "query": q.get("query"),
                             "difficulty": q.get("difficulty", "Unknown")
-                        })
-                    
+                        }) + b"\n")
+                    ckpt.flush()
+
                     # 进度日志
                     if completed_count % max_workers == 0:
-                        logger.info(f"Progress: {completed_count}/{real_sample_size} records processed...")
-                        
-                except Exception as e:
-                    logger.error(f"Worker exception for record ID {record.get('id')}: {e}")
-        
+                        logger.info(f"Progress: {completed_count}/{len(sampled_records)} records processed...")
+
+            await producer
+            await asyncio.gather(*workers)
+
+        asyncio.run(_run_all())
+
         # --- 保存结果 ---
-        # 按 ID 排序一下，因为并行执行后顺序会乱
+        # 从 checkpoint 汇总并按 ID 排序（并行执行后顺序是乱的）
+        eval_dataset = []
+        with open(checkpoint_file, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    eval_dataset.append(orjson.loads(line))
         eval_dataset.sort(key=lambda x: x['id'])
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(eval_dataset, f, indent=2, ensure_ascii=False)
+
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(eval_dataset, option=orjson.OPT_INDENT_2))
             
         logger.info(f"Successfully generated {len(eval_dataset)} test cases. Saved to {output_file}")
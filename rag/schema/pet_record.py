@@ -1,8 +1,8 @@
-from enum import Enum
+from functools import cached_property
 from typing import List, Dict, ClassVar
 from types import MappingProxyType
-from pydantic import BaseModel, Field, model_validator
-from common.species_enum import SpeciesEnum
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
+from common.species_enum import Species
 
 class PetRecord(BaseModel):
     """
@@ -13,7 +13,7 @@ class PetRecord(BaseModel):
     condition: str = Field(..., description="Original pet condition")
     
     # Metadata fields
-    species: SpeciesEnum
+    species: Species
     specific_breed: str
     symptom_keywords: List[str]
 
@@ -21,31 +21,37 @@ class PetRecord(BaseModel):
     # 1. 使用 ClassVar 标注这是一个类属性，而不是 Pydantic 的字段
     # 2. 命名以 _ 开头，表示这是“私有”的实现细节，外部不应访问
     # 3. 使用 MappingProxyType 包裹字典，使其在运行时成为【只读】，防止被意外修改
-    _NORMALIZATION_MAP: ClassVar[Dict[str, SpeciesEnum]] = MappingProxyType({
+    _NORMALIZATION_MAP: ClassVar[Dict[str, str]] = MappingProxyType({
         # --- Bird ---
-        "bird": SpeciesEnum.BIRD, "parrot": SpeciesEnum.BIRD, 
-        "cockatiel": SpeciesEnum.BIRD, "budgie": SpeciesEnum.BIRD, 
-        "finch": SpeciesEnum.BIRD, "canary": SpeciesEnum.BIRD, 
-        "avian": SpeciesEnum.BIRD,
-        
+        "bird": "bird", "parrot": "bird",
+        "cockatiel": "bird", "budgie": "bird",
+        "finch": "bird", "canary": "bird",
+        "avian": "bird",
+
         # --- Cat ---
-        "cat": SpeciesEnum.CAT, "kitten": SpeciesEnum.CAT,
-        
+        "cat": "cat", "kitten": "cat",
+
         # --- Dog ---
-        "dog": SpeciesEnum.DOG, "puppy": SpeciesEnum.DOG,
+        "dog": "dog", "puppy": "dog",
 
         # --- Other mammals ---
-        "ferret": SpeciesEnum.FERRET, 
-        "guinea pig": SpeciesEnum.GUINEA_PIG, "guinea_pig": SpeciesEnum.GUINEA_PIG,
-        "hamster": SpeciesEnum.HAMSTER,
-        "rabbit": SpeciesEnum.RABBIT, "bunny": SpeciesEnum.RABBIT,
+        "ferret": "ferret",
+        "guinea pig": "guinea_pig", "guinea_pig": "guinea_pig",
+        "hamster": "hamster",
+        "rabbit": "rabbit", "bunny": "rabbit",
 
         # --- Fallback ---
-        "unknown": SpeciesEnum.UNKNOWN, "pet": SpeciesEnum.UNKNOWN,
-        "other": SpeciesEnum.UNKNOWN, "none": SpeciesEnum.UNKNOWN,
-        "n/a": SpeciesEnum.UNKNOWN
+        "unknown": "unknown", "pet": "unknown",
+        "other": "unknown", "none": "unknown",
+        "n/a": "unknown"
     })
 
+    # 无效 breed 的判定集合：frozenset 成员判断是 C 级哈希查找，
+    # 不再每条记录构建一次临时 list
+    _INVALID_BREEDS: ClassVar[frozenset] = frozenset(
+        {"", "unknown", "generic", "none", "n/a", "pet"}
+    )
+
     @model_validator(mode='before')
     @classmethod
     def robust_cleaning(cls, data: dict):
@@ -57,25 +63,25 @@ class PetRecord(BaseModel):
         
         # 【关键修改】通过 cls._NORMALIZATION_MAP 访问，逻辑高度内聚
         # 即使 key 不存在，也不会报错，而是返回 UNKNOWN
-        normalized_species = cls._NORMALIZATION_MAP.get(raw_species, SpeciesEnum.UNKNOWN)
+        normalized_species = cls._NORMALIZATION_MAP.get(raw_species, "unknown")
         data["species"] = normalized_species
 
         # --- 2. Specific Breed Logic ---
         raw_breed = str(data.get("specific_breed", "")).lower().strip()
-        is_breed_invalid = not raw_breed or raw_breed in ["unknown", "generic", "none", "n/a", "pet"]
-        
-        if is_breed_invalid:
+
+        if raw_breed in cls._INVALID_BREEDS:
             # Fallback to the normalized species value (e.g., "cat")
-            data["specific_breed"] = normalized_species.value
+            data["specific_breed"] = normalized_species
         else:
             data["specific_breed"] = raw_breed
 
         # --- 3. Symptoms Cleaning ---
+        # 单个 set 推导完成去重 + 清洗，省掉中间 list 物化
         raw_symptoms = data.get("symptom_keywords", [])
         if raw_symptoms:
-            data["symptom_keywords"] = sorted(list(set(
-                [str(s).lower().strip() for s in raw_symptoms if s]
-            )))
+            data["symptom_keywords"] = sorted(
+                {str(s).lower().strip() for s in raw_symptoms if s}
+            )
         else:
             data["symptom_keywords"] = []
 
@@ -84,28 +90,35 @@ class PetRecord(BaseModel):
 
         return data
 
-    @property
+    # cached_property: 拼接只发生在首次访问，重复 embed/校验同一条记录时
+    # 后续读取就是一次属性查找
+    @cached_property
     def dense_search_content(self) -> str:
         symptoms_str = ", ".join(self.symptom_keywords)
         return (
-            f"category: {self.species.value}. "
+            f"category: {self.species}. "
             f"specific breed: {self.specific_breed}. "
             f"symptoms: {symptoms_str}. "
             f"observation: {self.text}"
         )
 
-    @property
+    @cached_property
     def sparse_search_content(self) -> str:
         symptoms_str = " ".join(self.symptom_keywords)
-        return f"{self.species.value} {self.specific_breed} {symptoms_str} {self.text}"
+        return f"{self.species} {self.specific_breed} {symptoms_str} {self.text}"
     
-    @property
+    @cached_property
     def payload(self) -> dict:
         return {
             "id": self.id,
-            "species": self.species.value,
+            "species": self.species,
             "specific_breed": self.specific_breed,
             "symptom_keywords": self.symptom_keywords,
             "text": self.text,
             "condition": self.condition
         }
+
+
+# 预编译的批量校验器：一次 C 级调用校验整个列表，
+# 比循环里逐条 PetRecord(**item) 少一层 Python 往返
+PET_RECORD_LIST_ADAPTER = TypeAdapter(List[PetRecord])
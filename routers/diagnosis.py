@@ -6,7 +6,8 @@ def diagnosis_router(state: DiagnosisState):
     """
     决定下一步去哪
     """
-    agent_status = state.get("agent_status", "")
+    # == 比较，兼容 checkpoint 恢复出的裸字符串 (见 routers/orchestrator.py)
+    agent_status = state.get("agent_status")
     if agent_status == AgentStatus.INQUIRY:
         return "inquiry_subgraph"
     elif agent_status == AgentStatus.DIAGNOSIS:
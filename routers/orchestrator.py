@@ -6,11 +6,9 @@ def orchestrator_router(state: OrchestratorState):
     """
     决定下一步去哪
     """
-    agent_status = state.get("agent_status", "")
+    # 用 == 而非 is：checkpoint 恢复的状态可能是裸字符串，str 枚举的
+    # __eq__ 对同一成员先走身份短路，几乎不吃亏但两种形态都认
+    agent_status = state.get("agent_status")
     if agent_status == AgentStatus.INQUIRY:
         return "inquiry_subgraph"
-    elif agent_status == AgentStatus.TREATMENT:
-        return END
-    elif agent_status == AgentStatus.KNOWLEDGE:
-        return END
     return END
@@ -1,3 +1,4 @@
+import sys
 from enum import Enum
 
 class AgentStatus(str, Enum):
@@ -6,4 +7,10 @@ class AgentStatus(str, Enum):
     DIAGNOSIS = "diagnosis"
     TREATMENT = "treatment"
     KNOWLEDGE = "knowledge"
-    END = "end"
\ No newline at end of file
+    END = "end"
+
+
+# 预 intern 枚举值字符串：成员本身是单例，router 里用 is 判分支；
+# 跟外部来的状态字符串比较时 intern 过的值能走指针快路径
+for _member in AgentStatus:
+    sys.intern(_member.value)
@@ -1,25 +1,35 @@
 from typing import List, Optional, Dict, Any
 from langgraph.graph import MessagesState
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 from state.agent_status import AgentStatus
-from state.pet_profile import PetProfile
+from state.pet_profile import PetProfile, ProfileView
 
-class DiagnosisState(MessagesState):
+# MessagesState 本身就是 TypedDict (messages 带 add_messages reducer)，
+# 节点边界上只做 dict merge、不走 pydantic-core 校验。
+# total=False：这些键都是可选的，节点统一用 state.get(key, default) 读取，
+# 类体里不放赋值 (TypedDict 的 "默认值" 并不会生效，徒增误导)。
+class DiagnosisState(MessagesState, total=False):
     agent_status: Optional[AgentStatus]
-    
+
     # --- multi-turn inquiry ---
     pet_profile: Optional[PetProfile]
-    inquiry_turns: int = 0
-    additional_inquiry_turns: int = 0
-    diagnosis_turns: int = 0
-    
+    # Extractor 合并后生成的预格式化视图，下游 Prompt 节点直接读
+    pet_profile_view: Optional[ProfileView]
+    inquiry_turns: int
+    additional_inquiry_turns: int
+    diagnosis_turns: int
+
     # --- RAG ---
-    search_queries: List[str] = []
-    retrieved_docs: List[str] = []
-    query_rewrite_count: int = 0
-    
-    diagnosis_draft: Optional[Dict[str, Any]] = None
+    search_queries: List[str]
+    retrieved_docs: List[str]
+    # 预拼接好的文档串 (Actor/Critic 直接用，避免每个下游各自 join 一次)
+    retrieved_docs_str: str
+    query_rewrite_count: int
+
+    # 直接存 Pydantic 对象 (LangGraph 支持任意对象)，
+    # 避免 Actor->Critic 之间 model_dump / 重新校验的往返
+    diagnosis_draft: Optional["DiagnosisActorOutput"]
 
 
 class MultiViewSearchQueries(BaseModel):
@@ -59,6 +69,30 @@ class DiagnosisActorOutput(BaseModel):
         description="Actionable advice for the pet owner (e.g., immediate ER visit, diet change, etc.)."
     )
 
+class DiagnosisCombinedOutput(BaseModel):
+    """
+    Actor + Critic 融合输出：一次结构化调用同时产出诊断与自审结果，
+    省掉第二次 LLM 往返。
+    """
+    key_symptoms_analysis: str = Field(
+        description="Brief analysis of the patient's symptoms based on the profile."
+    )
+    most_likely_condition: str = Field(
+        description="The SINGLE most probable medical condition identified. Do not list multiple."
+    )
+    reasoning: str = Field(
+        description="Why is this the most likely condition compared to others? Cite evidence."
+    )
+    is_approved: bool = Field(
+        description="True if the diagnosis is supported by evidence and safe; False if hallucinated or irrelevant."
+    )
+    critique: str = Field(
+        description="Self-review: reason for approval or rejection."
+    )
+    final_response_to_user: str = Field(
+        description="The final message to show to the user. If approved, polished advice including the condition name. If rejected, a safe fallback message."
+    )
+
 class DiagnosisCriticOutput(BaseModel):
     """
     Critic 节点的输出：审核结果。
@@ -72,3 +106,10 @@ class DiagnosisCriticOutput(BaseModel):
     final_response_to_user: str = Field(
         description="The final message to show to the user. If approved, polish the Actor's advice. If rejected, write a safe fallback message."
     )
+
+
+# 模块级 TypeAdapter：pydantic-core 的 SchemaValidator 在 import 时构建一次，
+# Critic 校验旧 checkpoint 字典草稿时直接复用 (同 rag/schema/pet_record.py
+# 的 PET_RECORD_LIST_ADAPTER)。其余模型的解析由 with_structured_output
+# 在 LangChain 内部完成，这里不另建用不上的 adapter。
+DIAGNOSIS_ACTOR_ADAPTER = TypeAdapter(DiagnosisActorOutput)
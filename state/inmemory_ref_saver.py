@@ -0,0 +1,39 @@
+import copy
+from typing import Any, Tuple
+
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class _RefSerializer:
+    """按引用"序列化"：不做任何编码，原样存取 Python 对象。
+
+    MemorySaver 每次 put 都会把整份 State (含可能很大的 retrieved_docs)
+    走一遍 JSON 序列化。单进程 CLI 下 checkpoint 从不跨进程，序列化纯属
+    浪费——这里直接把对象塞进父类的 dict。浅拷贝容器层，防止后续节点
+    原地改 list/dict 污染已落盘的 checkpoint (State 更新本身是替换式的，
+    深层共享是安全的)。
+    """
+
+    def dumps(self, obj: Any) -> Any:
+        return obj
+
+    def loads(self, data: Any) -> Any:
+        return data
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, Any]:
+        return "ref", copy.copy(obj)
+
+    def loads_typed(self, data: Tuple[str, Any]) -> Any:
+        return copy.copy(data[1])
+
+
+class InMemoryRefSaver(MemorySaver):
+    """单进程专用的免序列化 checkpointer。
+
+    复用 MemorySaver 的全部存取逻辑，只把 serde 换成按引用传递的空实现。
+    仅在 checkpoint 不出进程时有效；多进程 / 分布式部署请回退 MemorySaver
+    (vet_agent.py 里由 VET_AGENT_SHARED_CHECKPOINTS 开关控制)。
+    """
+
+    def __init__(self) -> None:
+        super().__init__(serde=_RefSerializer())
@@ -5,7 +5,9 @@ from state.user_intent import IntentType
 from typing import Annotated, Optional
 from langgraph.graph import MessagesState
 
-class OrchestratorState(MessagesState):
+# MessagesState 已是 TypedDict；total=False 标明这些键可缺省，
+# 节点用 state.get() 读取
+class OrchestratorState(MessagesState, total=False):
     agent_status: Optional[AgentStatus]
     user_intent: Optional[IntentType]
     pet_profile: Optional[PetProfile]
\ No newline at end of file
@@ -1,13 +1,30 @@
 # 文件路径: state/pet_profile.py
-from pydantic import BaseModel, Field, field_validator
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from itertools import chain
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List, Any
 # 确保这里导入路径是你移动后的位置
-from common.species_enum import SpeciesEnum 
+from common.species_enum import Species, species_str
+
+# 症状清洗的模块级常量：分隔符正则编译一次，哨兵词用 frozenset 做 C 级查找
+_SYMPTOM_SEP = re.compile(r'[,;\n]+')
+_SYMPTOM_SENTINELS = frozenset({"none", "null", "n/a", "no symptoms", ""})
 
 class PetProfile(BaseModel):
+    # frozen: 节点间只传引用、从不就地改档案 (merge_profiles 总是重建)，
+    # 冻结后跳过 validate_assignment 路径，也保证派生缓存永不失效
+    model_config = ConfigDict(
+        frozen=True,
+        extra="ignore",
+        str_strip_whitespace=True,
+        validate_default=False,
+    )
+
     # mandatory    
     name: Optional[str] = Field(None, description="The name of the pet")
-    species: Optional[SpeciesEnum] = Field(None, description="The biological species of the pet (e.g., dog, cat)")
+    species: Optional[Species] = Field(None, description="The biological species of the pet (e.g., dog, cat)")
     breed: Optional[str] = Field(None, description="The breed of the pet (e.g., Golden Retriever, Cockatiel)")
     symptoms: List[str] = Field(
         default_factory=list, 
@@ -27,25 +44,25 @@ class PetProfile(BaseModel):
         """
         if v is None:
             return []
-        
+
         if isinstance(v, str):
-            if v.lower() in ["none", "null", "n/a", "no symptoms", ""]:
-                return []
-            return [s.strip() for s in v.split(',') if s.strip()]
+            return [
+                s for s in (x.strip() for x in _SYMPTOM_SEP.split(v))
+                if s and s.lower() not in _SYMPTOM_SENTINELS
+            ]
 
         if isinstance(v, list):
-            cleaned_list = []
-            for item in v:
-                if isinstance(item, list):
-                    for sub_item in item:
-                        if isinstance(sub_item, str) and sub_item.strip():
-                            cleaned_list.append(sub_item.strip())
-                elif isinstance(item, str):
-                    s = item.strip()
-                    if s and s.lower() not in ["none", "n/a"]:
-                        cleaned_list.append(s)
-            return cleaned_list
-            
+            # 单层嵌套列表先摊平，再统一走清洗/哨兵过滤
+            flat = chain.from_iterable(
+                item if isinstance(item, list) else (item,) for item in v
+            )
+            return [
+                s for x in flat
+                if isinstance(x, str)
+                and (s := x.strip())
+                and s.lower() not in _SYMPTOM_SENTINELS
+            ]
+
         return []
 
     @field_validator('name', 'species', 'breed', 'age', 'sex', 'weight', 'language', mode='before')
@@ -62,13 +79,15 @@ class PetProfile(BaseModel):
                 return None
         return v
     
-    @property
+    # cached_property: 一回合里 QueryGen/Actor/Critic/日志都会读 summarization，
+    # frozen 模型保证缓存永不过期，多行拼接只做一次
+    @cached_property
     def summarization(self) -> str:
         # 1. Handle the list safely
         symptoms_str = ". ".join(self.symptoms) if self.symptoms else "None reported"
         
-        # 2. Handle the Enum safely (get the .value, otherwise handle None)
-        species_str = self.species.value if self.species else "Unknown"
+        # 2. Handle missing species (plain Literal str now, no Enum unwrap)
+        species_val = self.species if self.species else "Unknown"
 
         # 3. Use Parentheses for cleaner multi-line f-strings
         # We also use 'or' to provide fallback text for None values
@@ -76,7 +95,7 @@ class PetProfile(BaseModel):
             f"📋 Pet Profile Summary:\n"
             f"-----------------------\n"
             f"Name:     {self.name or 'Unknown'}\n"
-            f"Species:  {species_str}\n"
+            f"Species:  {species_val}\n"
             f"Breed:    {self.breed or 'Unknown'}\n"
             f"Age:      {self.age or 'N/A'}\n"
             f"Sex:      {self.sex or 'N/A'}\n"
@@ -84,3 +103,27 @@ class PetProfile(BaseModel):
             f"Symptoms: {symptoms_str}\n"
             f"Language: {self.language}\n"
         )
+
+@dataclass(frozen=True, slots=True)
+class ProfileView:
+    """Extractor 合并完档案后生成的一次性预格式化视图。
+
+    Actor / Critic / QueryGen 的 Prompt 都只需要这几个字符串，
+    在这里算一次，下游节点直接读，不再各自做 Enum 取值 / join / 兜底。
+    frozen + slots: 不可变且省掉 __dict__ 开销。
+    """
+    species: str
+    breed: str
+    age: str
+    symptoms_joined: str
+    language: str
+
+    @classmethod
+    def from_profile(cls, profile: "PetProfile") -> "ProfileView":
+        return cls(
+            species=species_str(profile.species),
+            breed=str(profile.breed or "unknown"),
+            age=str(profile.age or "unknown"),
+            symptoms_joined=", ".join(profile.symptoms or []),
+            language=profile.language or "English",
+        )
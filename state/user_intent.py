@@ -1,3 +1,4 @@
+import sys
 from enum import Enum
 from pydantic import BaseModel, Field, field_validator, ValidationError
 
@@ -12,4 +13,10 @@ class IntentType(str, Enum):
     
 class UserIntentOutput(BaseModel):
     intent: IntentType
-    confidence: float = Field(description="0.0 to 1.0 confidence score")
\ No newline at end of file
+    confidence: float = Field(description="0.0 to 1.0 confidence score")
+
+
+# 预 intern 枚举值字符串 (同 state/agent_status.py)
+for _member in IntentType:
+    sys.intern(_member.value)
+
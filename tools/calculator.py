@@ -1,10 +1,45 @@
+import ast
+import functools
+import operator
+
 from langchain_core.tools import tool
 
+# 白名单之外的节点一律拒绝：既堵住 eval 的任意代码执行，
+# 也让表达式只剩纯算术，编译结果可以安全缓存
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile(expression: str):
+    """解析 + 校验 + 编译一次，相同表达式 (如 '2 + 2') 后续直接命中缓存。"""
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"unsupported expression element: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"unsupported constant: {node.value!r}")
+    return compile(tree, "<calc>", "eval")
+
+
 @tool
 def calculator(expression: str) -> str:
     """Useful for calculating math expressions. Input should be a mathematical expression string like '2 + 2'."""
     try:
-        # Warning: eval is dangerous in production, using for simple demo purposes only
-        return str(eval(expression))
+        code = _compile(expression)
+        return str(eval(code, {"__builtins__": {}}, {}))
     except Exception as e:
-        return f"Error calculating: {e}"
\ No newline at end of file
+        return f"Error calculating: {e}"
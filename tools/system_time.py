@@ -1,7 +1,11 @@
+import datetime
+
 from langchain_core.tools import tool
 
+# 模块级绑定：每次调用省掉函数体内的 import 查找和两级属性链
+_now = datetime.datetime.now
+
 @tool
 def get_system_time() -> str:
     """Returns the current system time."""
-    import datetime
-    return str(datetime.datetime.now())
\ No newline at end of file
+    return str(_now())
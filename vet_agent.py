@@ -1,14 +1,23 @@
 import os
 import asyncio
+import concurrent.futures
+import sys
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
+from common.serde import OrjsonSerializer
+from state.inmemory_ref_saver import InMemoryRefSaver
 from workflows.orchestrator import OrchestratorWorkflow
 
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# stdin 专用单线程 executor：不跟默认线程池里 LangGraph 派发的任务抢位子
+_stdin_exec = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="stdin"
+)
+
 from dotenv import load_dotenv
 loaded = load_dotenv()
 print(f"1. .env Loaded Success? {loaded}")
@@ -22,15 +31,34 @@ async def run_interaction_loop_async():
     # 这是一个唯一的会话ID
     thread_id = "user_session_001"
     config = {"configurable": {"thread_id": thread_id}}
-    memory = MemorySaver()
+    # 单进程 CLI 默认按引用存 checkpoint，整个 serde 路径归零；
+    # 需要跨进程共享 checkpoint 时置 VET_AGENT_SHARED_CHECKPOINTS=1
+    # 回退 orjson 序列化的 MemorySaver (见 common/serde.py)
+    if os.getenv("VET_AGENT_SHARED_CHECKPOINTS", "0") == "1":
+        memory = MemorySaver(serde=OrjsonSerializer())
+    else:
+        memory = InMemoryRefSaver()
     graph = OrchestratorWorkflow().get_runnable(memory)
+
+    # Warm-up: 提前加载 Retriever (Embedding/Reranker 权重)，避免首轮诊断时冷启动
+    try:
+        from agents.diagnosis_retriever import get_retriever
+        await asyncio.to_thread(get_retriever)
+    except Exception as e:
+        logger.warning("Retriever warm-up failed (will retry lazily): %s", e)
     
     logger.info("----- Vet Agent -----")
-    
+
+    # 子图 (inquiry/diagnosis) 作为主图节点时，updates 事件带回的是子图的
+    # 完整输出 State——messages 是累计的全量历史而非增量。按消息 id 去重，
+    # 保证每条回复整个会话只打印一次
+    printed_ids = set()
+
     while True:
         loop = asyncio.get_running_loop()
         try:
-            user_input = await loop.run_in_executor(None, input, "\nUser >: ")
+            sys.stdout.flush()
+            user_input = await loop.run_in_executor(_stdin_exec, input, "\nUser >: ")
         except EOFError:
             break
 
@@ -40,17 +68,31 @@ async def run_interaction_loop_async():
         input_message = HumanMessage(content=user_input)
         
         try:
+            # updates 模式：每个事件只带产生它的节点的增量，
+            # 不再逐步收到全量 State、重复打印同一条尾部消息
             async for event in graph.astream(
-                {"messages": [input_message]}, 
-                config, 
-                stream_mode="values"
+                {"messages": [input_message]},
+                config,
+                stream_mode="updates"
             ):
-                if "messages" in event:
-                    last_msg = event["messages"][-1]
-                    if isinstance(last_msg, AIMessage):
-                        logger.info(f"Agent: {last_msg.content}")
+                # 回复可能有好几 KB；INFO 被关掉 (如依赖 LangSmith 看内容) 时
+                # 连 isinstance 扫描都省掉
+                if not logger.isEnabledFor(logging.INFO):
+                    continue
+                for node_update in event.values():
+                    if not node_update:
+                        continue
+                    new_msgs = node_update.get("messages") or []
+                    for msg in new_msgs:
+                        if not (isinstance(msg, AIMessage) and msg.content):
+                            continue
+                        msg_key = msg.id or id(msg)
+                        if msg_key in printed_ids:
+                            continue
+                        printed_ids.add(msg_key)
+                        logger.info("Agent: %s", msg.content)
         except Exception as e:
-            logger.info(f"Error: {e}")
+            logger.info("Error: %s", e)
             break
 
 if __name__ == "__main__":
@@ -1,4 +1,9 @@
+import hashlib
+import os
+
 from langgraph.graph import StateGraph, START, END
+from langgraph.cache.memory import InMemoryCache
+from langgraph.types import CachePolicy
 from state.diagnosis import DiagnosisState
 
 # RAG Diagnosis Phase Nodes
@@ -6,20 +11,46 @@ from agents.diagnosis_query_generator import diagnostic_query_generator_node
 from agents.diagnosis_retriever import diagnosis_retriever_node
 from agents.diagnosis_actor import diagnosis_actor_node
 from agents.diagnosis_critic import diagnosis_critic_node
+from agents.diagnosis_combined import diagnosis_combined_node
+
+# Feature flag: 默认走 Actor+Critic 融合单节点 (省一次 LLM 往返)；
+# 设为 "0" 回退到两段式，便于 A/B 对比
+_FUSE_ACTOR_CRITIC = os.getenv("DIAGNOSIS_FUSE_ACTOR_CRITIC", "1") != "0"
+
+
+def _profile_cache_key(state) -> str:
+    """节点缓存 key：档案摘要的哈希。
+
+    同一份 pet_profile 在 TTL 内再次进入诊断链路 (用户追问/重试) 时，
+    查询生成的 LLM 调用和向量检索直接复用上次的输出。
+    """
+    profile = state.get("pet_profile")
+    summary = profile.summarization if profile else ""
+    return hashlib.sha256(summary.encode("utf-8")).hexdigest()
+
+
+_PROFILE_CACHE_POLICY = CachePolicy(key_func=_profile_cache_key, ttl=600)
 
 class DiagnosisWorkflow:
     def __init__(self):
         self.graph = None
-    
+
     def build(self):
         # 初始化 StateGraph
         workflow = StateGraph(DiagnosisState)
 
         # --- 1. Add Nodes (仅包含 RAG 诊断链路的节点) ---
-        workflow.add_node("diagnostic_query_generator_node", diagnostic_query_generator_node)
-        workflow.add_node("diagnostic_retrieve_node", diagnosis_retriever_node)
-        workflow.add_node("diagnosis_actor_node", diagnosis_actor_node)
-        workflow.add_node("diagnosis_critic_node", diagnosis_critic_node)
+        # 两个最贵的节点 (LLM 查询生成 + 远端向量检索) 按档案哈希缓存
+        workflow.add_node(
+            "diagnostic_query_generator_node",
+            diagnostic_query_generator_node,
+            cache_policy=_PROFILE_CACHE_POLICY,
+        )
+        workflow.add_node(
+            "diagnostic_retrieve_node",
+            diagnosis_retriever_node,
+            cache_policy=_PROFILE_CACHE_POLICY,
+        )
 
         # --- 2. Define Edges (纯线性流程) ---
 
@@ -30,17 +61,26 @@ class DiagnosisWorkflow:
         # Step 1 -> Step 2: 生成 Query 后去检索
         workflow.add_edge("diagnostic_query_generator_node", "diagnostic_retrieve_node")
 
-        # Step 2 -> Step 3: 检索完成后给 Actor 诊断
-        workflow.add_edge("diagnostic_retrieve_node", "diagnosis_actor_node")
+        if _FUSE_ACTOR_CRITIC:
+            # Step 3: 诊断 + 审核融合成一次调用，输出最终回复
+            workflow.add_node("diagnosis_combined_node", diagnosis_combined_node)
+            workflow.add_edge("diagnostic_retrieve_node", "diagnosis_combined_node")
+            workflow.add_edge("diagnosis_combined_node", END)
+        else:
+            workflow.add_node("diagnosis_actor_node", diagnosis_actor_node)
+            workflow.add_node("diagnosis_critic_node", diagnosis_critic_node)
+
+            # Step 2 -> Step 3: 检索完成后给 Actor 诊断
+            workflow.add_edge("diagnostic_retrieve_node", "diagnosis_actor_node")
+
+            # Step 3 -> Step 4: 诊断完给 Critic 审核
+            workflow.add_edge("diagnosis_actor_node", "diagnosis_critic_node")
 
-        # Step 3 -> Step 4: 诊断完给 Critic 审核
-        workflow.add_edge("diagnosis_actor_node", "diagnosis_critic_node")
-        
-        # Step 4 -> End: Critic 输出最终回复，流程结束
-        # 此时控制权交还给 Orchestrator
-        workflow.add_edge("diagnosis_critic_node", END)
+            # Step 4 -> End: Critic 输出最终回复，流程结束
+            # 此时控制权交还给 Orchestrator
+            workflow.add_edge("diagnosis_critic_node", END)
 
-        self.graph =  workflow.compile()
+        self.graph = workflow.compile(cache=InMemoryCache())
         return self.graph
     
     def get_runnable(self):
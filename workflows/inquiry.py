@@ -14,7 +14,11 @@ class InquiryWorkflow:
         inquiry_workflow.add_node("inquiry_node", inquiry_node)
 
         inquiry_workflow.set_entry_point("extractor_node")
-        
+
+        # 注意：extractor -> inquiry 的串行边是真实数据依赖，不能并行化。
+        # inquiry_node 的缺失字段分析、结束条件 (转 DIAGNOSIS) 和追问 Prompt
+        # 全部基于 extractor 合并后的最新 pet_profile；并发执行会基于
+        # 上一轮的旧档案提问/路由 (重复追问已回答的字段)。
         inquiry_workflow.add_edge("extractor_node", "inquiry_node")
         inquiry_workflow.add_edge("inquiry_node", END)
         
@@ -7,6 +7,11 @@ from workflows.inquiry import InquiryWorkflow
 from workflows.diagnosis import DiagnosisWorkflow
 from routers.diagnosis import diagnosis_router
 
+# 子图在 import 时编译一次：子图结构与会话无关，只有主图的 checkpointer
+# 随会话变化。重复 build() (测试 / 每会话重建) 不再重复实例化 + 编译子图。
+_INQUIRY_SUBGRAPH = InquiryWorkflow().get_runnable()
+_DIAGNOSIS_SUBGRAPH = DiagnosisWorkflow().get_runnable()
+
 class OrchestratorWorkflow:
     def __init__(self):
         self.graph = None
@@ -16,12 +21,8 @@ class OrchestratorWorkflow:
         orchestrator_workflow = StateGraph(OrchestratorState)
         # 1. 添加 Router 节点
         orchestrator_workflow.add_node("orchestrator_node", orchestrator_node)
-        inquiry_workflow_instance = InquiryWorkflow()
-        inquiry_subgraph = inquiry_workflow_instance.get_runnable()
-        orchestrator_workflow.add_node("inquiry_subgraph", inquiry_subgraph)
-        diagnosis_workflow_instance = DiagnosisWorkflow()
-        diagnosis_subgraph = diagnosis_workflow_instance.get_runnable()
-        orchestrator_workflow.add_node("diagnosis_subgraph", diagnosis_subgraph)
+        orchestrator_workflow.add_node("inquiry_subgraph", _INQUIRY_SUBGRAPH)
+        orchestrator_workflow.add_node("diagnosis_subgraph", _DIAGNOSIS_SUBGRAPH)
 
         # 3. 设置连线
         orchestrator_workflow.set_entry_point("orchestrator_node")